@@ -0,0 +1,261 @@
+import atexit
+import heapq
+import itertools
+import json
+import os
+import threading
+import urllib.request
+from datetime import date, datetime, time, timedelta
+
+ALERTAS_ACTIVAS     = os.getenv("ALERTAS_ACTIVAS", "1") == "1"
+ALERTAS_DIAS_AVISO  = int(os.getenv("ALERTAS_DIAS_AVISO", "7"))
+ALERTAS_ARCHIVO     = os.getenv("ALERTAS_ARCHIVO", "")        # vacío = sin sumidero de archivo
+ALERTAS_WEBHOOK_URL = os.getenv("ALERTAS_WEBHOOK_URL", "")
+
+def _a_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+# ------------------------- Sumideros -------------------------
+class SumideroArchivo:
+    """Agrega cada alerta como una línea JSON al archivo indicado."""
+
+    def __init__(self, ruta):
+        self.ruta = os.path.abspath(ruta)   # no depende del cwd al escribir
+        self._lock = threading.Lock()
+
+    def enviar(self, alerta):
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alerta, ensure_ascii=False) + "\n")
+
+
+class SumideroWebhook:
+    """Envía cada alerta como POST JSON a un webhook local."""
+
+    def __init__(self, url, timeout=2):
+        self.url = url
+        self.timeout = timeout
+
+    def enviar(self, alerta):
+        req = urllib.request.Request(
+            self.url,
+            data=json.dumps(alerta).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout):
+            pass
+
+# ------------------------- Motor -------------------------
+class MotorAlertas:
+    """Cola de prioridad (heap) con los vencimientos de las programaciones.
+
+    Se carga una sola vez desde la BD y luego se mantiene al día desde los
+    handlers de /programaciones (programar / quitar, O(log n) por cambio).
+    Un hilo duerme hasta el siguiente vencimiento y dispara dos alertas por
+    programación: 'proxima' (dias_aviso antes de fecha_proxima) y 'vencida'
+    (al pasar fecha_proxima). Cada alerta queda en la tabla alertas (una por
+    programación, tipo y fecha) y se envía a los sumideros configurados.
+    """
+
+    ESPERA_MAX = 3600   # segundos; re-evalúa el reloj aunque no haya cambios
+    REINTENTO  = 60     # segundos antes de reintentar una alerta que falló al dispararse
+    REINTENTO_CARGA = 5 # primera espera si la carga inicial falla (se duplica hasta ESPERA_MAX)
+
+    def __init__(self, almacen, sumideros=(), dias_aviso=ALERTAS_DIAS_AVISO, reloj=datetime.now):
+        self.almacen = almacen
+        self.sumideros = list(sumideros)
+        self.dias_aviso = dias_aviso
+        self.reloj = reloj
+        self.disparadas = 0
+        self.reintentos = 0
+        self.cargado = False
+        self._heap = []          # (momento, seq, programacion_id, tipo, fecha_proxima)
+        self._vigentes = {}      # programacion_id -> fecha_proxima vigente
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._activo = False
+
+    # --- Sincronización con la BD / handlers ---
+    def cargar(self):
+        filas = self.almacen.programaciones.listar_vencimientos()
+        with self._cond:
+            for f in filas:
+                self._programar(f["id"], f["fecha_proxima"])
+            self.cargado = True
+            self._cond.notify()
+
+    def programar(self, programacion_id, fecha_proxima):
+        try:
+            fecha = _a_fecha(fecha_proxima)
+        except (TypeError, ValueError):
+            return
+        with self._cond:
+            self._programar(programacion_id, fecha)
+            self._cond.notify()
+
+    def quitar(self, programacion_id):
+        with self._cond:
+            self._vigentes.pop(programacion_id, None)
+            self._compactar()
+
+    def _programar(self, programacion_id, fecha):
+        fecha = _a_fecha(fecha)
+        if self._vigentes.get(programacion_id) == fecha:
+            return
+        # Las entradas anteriores quedan obsoletas y se descartan al salir del heap
+        self._vigentes[programacion_id] = fecha
+        inicio = datetime.combine(fecha, time.min)
+        heapq.heappush(self._heap, (inicio - timedelta(days=self.dias_aviso), next(self._seq),
+                                    programacion_id, "proxima", fecha))
+        heapq.heappush(self._heap, (inicio + timedelta(days=1), next(self._seq),
+                                    programacion_id, "vencida", fecha))
+        self._compactar()
+
+    def _compactar(self):
+        # Reconstruye el heap (O(n)) solo cuando las entradas obsoletas dominan
+        if len(self._heap) > 64 and len(self._heap) > 4 * len(self._vigentes):
+            self._heap = [e for e in self._heap if self._vigentes.get(e[2]) == e[4]]
+            heapq.heapify(self._heap)
+
+    # --- Disparo ---
+    def _extraer_pendientes(self, ahora):
+        pendientes = []
+        while self._heap and self._heap[0][0] <= ahora:
+            _, _, programacion_id, tipo, fecha = heapq.heappop(self._heap)
+            if self._vigentes.get(programacion_id) != fecha:
+                continue
+            if tipo == "proxima" and ahora >= datetime.combine(fecha, time.min) + timedelta(days=1):
+                continue   # ya vencida: basta con la alerta 'vencida'
+            pendientes.append((programacion_id, tipo, fecha))
+        return pendientes
+
+    def revisar(self):
+        """Dispara las alertas cuyo momento ya llegó; devuelve cuántas se registraron."""
+        ahora = self.reloj()
+        with self._cond:
+            pendientes = self._extraer_pendientes(ahora)
+        total, fallidas = 0, []
+        for programacion_id, tipo, fecha in pendientes:
+            try:
+                if self._disparar(programacion_id, tipo, fecha, ahora):
+                    total += 1
+            except Exception as e:
+                print("No se pudo registrar alerta (se reintentará):", e)
+                fallidas.append((programacion_id, tipo, fecha))
+        if fallidas:
+            # Vuelven al heap con un retraso; la unicidad en la tabla evita duplicados
+            reintento = ahora + timedelta(seconds=self.REINTENTO)
+            with self._cond:
+                for programacion_id, tipo, fecha in fallidas:
+                    if self._vigentes.get(programacion_id) == fecha:
+                        heapq.heappush(self._heap, (reintento, next(self._seq), programacion_id, tipo, fecha))
+                        self.reintentos += 1
+        return total
+
+    def _disparar(self, programacion_id, tipo, fecha, ahora):
+        det = self.almacen.programaciones.obtener_detalle(programacion_id)
+        if not det:
+            self.quitar(programacion_id)
+            return False
+        if det["fecha_proxima"] != fecha.isoformat():
+            # Cambió fuera de los handlers: re-sincroniza con la BD
+            self.programar(programacion_id, det["fecha_proxima"])
+            return False
+
+        dias = (fecha - ahora.date()).days
+        if tipo == "vencida":
+            mensaje = f"{det['etiqueta_activo']}: mantenimiento vencido desde {fecha.isoformat()}"
+        else:
+            mensaje = f"{det['etiqueta_activo']}: mantenimiento en {dias} día(s) ({fecha.isoformat()})"
+
+        alerta = {
+            "programacion_id": programacion_id,
+            "equipo_id": det["equipo_id"],
+            "etiqueta_activo": det["etiqueta_activo"],
+            "laboratorio": det["laboratorio"],
+            "tipo": tipo,
+            "fecha_proxima": fecha.isoformat(),
+            "dias_restantes": dias,
+            "fecha_alerta": ahora.strftime("%Y-%m-%d %H:%M:%S"),
+            "mensaje": mensaje,
+        }
+        if not self.almacen.alertas.registrar(alerta):
+            return False   # ya se había disparado (p. ej. antes de reiniciar)
+
+        for s in self.sumideros:
+            try:
+                s.enviar(alerta)
+            except Exception as e:
+                print(f"Sumidero {type(s).__name__} falló:", e)
+        self.disparadas += 1
+        return True
+
+    # --- Hilo ---
+    def iniciar(self):
+        if self._hilo:
+            return
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="motor-alertas", daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def detener(self):
+        atexit.unregister(self.detener)
+        with self._cond:
+            self._activo = False
+            self._cond.notify()
+        if self._hilo:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+    def _cargar_con_reintentos(self):
+        # P. ej. MySQL aún arrancando: sin la carga inicial las programaciones
+        # existentes nunca alertarían, así que se reintenta hasta lograrlo
+        espera = self.REINTENTO_CARGA
+        while self._activo:
+            try:
+                self.cargar()
+                return
+            except Exception as e:
+                print(f"No se pudieron cargar programaciones para alertas (reintento en {espera}s):", e)
+            with self._cond:
+                if self._activo:
+                    self._cond.wait(espera)
+            espera = min(espera * 2, self.ESPERA_MAX)
+
+    def _bucle(self):
+        self._cargar_con_reintentos()
+        while self._activo:
+            self.revisar()
+            with self._cond:
+                if not self._activo:
+                    break
+                espera = self.ESPERA_MAX
+                if self._heap:
+                    espera = min(espera, max((self._heap[0][0] - self.reloj()).total_seconds(), 0))
+                self._cond.wait(espera)
+
+    def estado(self):
+        with self._cond:
+            return {
+                "cargado": self.cargado,
+                "programaciones": len(self._vigentes),
+                "en_cola": len(self._heap),
+                "disparadas": self.disparadas,
+                "reintentos": self.reintentos,
+                "proximo": self._heap[0][0].strftime("%Y-%m-%d %H:%M:%S") if self._heap else None,
+            }
+
+
+def crear_motor_alertas(almacen, config):
+    sumideros = []
+    if config.get("ALERTAS_ARCHIVO"):
+        sumideros.append(SumideroArchivo(config["ALERTAS_ARCHIVO"]))
+    if config.get("ALERTAS_WEBHOOK_URL"):
+        sumideros.append(SumideroWebhook(config["ALERTAS_WEBHOOK_URL"]))
+    return MotorAlertas(almacen, sumideros, dias_aviso=config.get("ALERTAS_DIAS_AVISO", ALERTAS_DIAS_AVISO))
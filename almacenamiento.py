@@ -0,0 +1,711 @@
+import json
+import os
+import shutil
+import tempfile
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+
+from conexion import getConexion, getConexionSQLite, SQLITE_PATH
+
+_AQUI = os.path.dirname(os.path.abspath(__file__))
+ESQUEMA_SQLITE    = os.path.join(_AQUI, "sis_control_sqlite.sql")
+MIGRACIONES_MYSQL = os.path.join(_AQUI, "sis_control_migraciones.sql")
+
+Resultado = namedtuple("Resultado", ["lastrowid", "rowcount"])
+
+TAM_LOTE = 500   # valores por cláusula IN en operaciones por lote
+
+def _trozos(valores, n=TAM_LOTE):
+    for i in range(0, len(valores), n):
+        yield valores[i:i + n]
+
+def _sentencias(script):
+    """Separa un script SQL simple (sin ';' dentro de literales) en sentencias."""
+    lineas = [l for l in script.splitlines() if not l.lstrip().startswith("--")]
+    return [s.strip() for s in "\n".join(lineas).split(";") if s.strip()]
+
+def _marcadores(n):
+    return ", ".join(["%s"] * n)
+
+def _tabla_etiquetas(n):
+    """Tabla derivada con n etiquetas (una por fila) para cruzarla con equipos en la
+    BD, que así las empareja con su propia collation. SQLite admite hasta 500 SELECT
+    por consulta compuesta: n <= TAM_LOTE."""
+    return "SELECT %s AS etiqueta" + " UNION ALL SELECT %s" * (n - 1)
+
+# ------------------------- Sesión (una conexión / transacción) -------------------------
+class Sesion:
+    """Envuelve una conexión abierta; el SQL se escribe siempre con placeholders %s."""
+
+    def __init__(self, backend, conn):
+        self.backend = backend
+        self.conn = conn
+        self.cur = backend._cursor(conn)
+
+    def consultar(self, sql, params=()):
+        self.cur.execute(self.backend._sql(sql), tuple(params))
+        return self.cur.fetchall()
+
+    def consultar_uno(self, sql, params=()):
+        self.cur.execute(self.backend._sql(sql), tuple(params))
+        return self.cur.fetchone()
+
+    def ejecutar(self, sql, params=()):
+        self.cur.execute(self.backend._sql(sql), tuple(params))
+        return Resultado(self.cur.lastrowid, self.cur.rowcount)
+
+# ------------------------- Backends -------------------------
+class Almacenamiento:
+    """Interfaz de almacenamiento: expone un repositorio por entidad
+    (laboratorios, usuarios, equipos, programaciones, mantenimientos, incidencias, alertas).
+    Cada backend solo aporta la conexión y las diferencias de dialecto SQL."""
+
+    nombre = None
+
+    def __init__(self):
+        self.laboratorios   = LaboratoriosRepo(self)
+        self.usuarios       = UsuariosRepo(self)
+        self.equipos        = EquiposRepo(self)
+        self.programaciones = ProgramacionesRepo(self)
+        self.mantenimientos = MantenimientosRepo(self)
+        self.incidencias    = IncidenciasRepo(self)
+        self.alertas        = AlertasRepo(self)
+        self.auditoria      = AuditoriaRepo(self)
+
+    # --- A implementar por cada backend ---
+    def conectar(self):
+        raise NotImplementedError
+
+    def _cursor(self, conn):
+        raise NotImplementedError
+
+    def _sql(self, sql):
+        return sql
+
+    def fecha(self, col):
+        """Expresión SQL que formatea una columna DATE como 'YYYY-MM-DD'."""
+        raise NotImplementedError
+
+    def fecha_hora(self, col):
+        """Expresión SQL que formatea una columna DATETIME como 'YYYY-MM-DD HH:MM:SS'."""
+        raise NotImplementedError
+
+    def entero(self, expr):
+        raise NotImplementedError
+
+    def insertar_o_ignorar(self):
+        """Prefijo de INSERT que ignora filas que violan una clave única."""
+        raise NotImplementedError
+
+    def sin_mayusculas(self, col):
+        """Columna comparada sin distinguir mayúsculas (para IN / = sobre etiquetas)."""
+        raise NotImplementedError
+
+    def empieza_con(self, col):
+        """Condición de prefijo (sin distinguir mayúsculas) que puede usar el índice
+        de la columna; el parámetro se arma con patron_prefijo()."""
+        raise NotImplementedError
+
+    def patron_prefijo(self, prefijo):
+        for c in ("\\", "%", "_"):
+            prefijo = prefijo.replace(c, "\\" + c)
+        return prefijo + "%"
+
+    def inicializar(self):
+        """Prepara el esquema si el backend lo gestiona (MySQL usa sis_control.sql)."""
+        pass
+
+    # --- Comunes ---
+    @contextmanager
+    def sesion(self):
+        conn = self.conectar()
+        s = Sesion(self, conn)
+        try:
+            yield s
+            conn.commit()
+        except Exception:
+            try: conn.rollback()
+            except: pass
+            raise
+        finally:
+            try:
+                s.cur.close()
+                conn.close()
+            except:
+                pass
+
+    def consultar(self, sql, params=()):
+        with self.sesion() as s:
+            return s.consultar(sql, params)
+
+    def consultar_uno(self, sql, params=()):
+        with self.sesion() as s:
+            return s.consultar_uno(sql, params)
+
+    def ejecutar(self, sql, params=()):
+        with self.sesion() as s:
+            return s.ejecutar(sql, params)
+
+    def ping(self):
+        return self.consultar_uno("SELECT 1 AS ok") is not None
+
+
+class MySQLAlmacenamiento(Almacenamiento):
+    nombre = "mysql"
+
+    def conectar(self):
+        return getConexion()
+
+    def _cursor(self, conn):
+        return conn.cursor(buffered=True, dictionary=True)
+
+    def fecha(self, col):
+        return f"DATE_FORMAT({col}, '%Y-%m-%d')"
+
+    def fecha_hora(self, col):
+        # %S (mayúscula) en lugar de %s: el conector trataría '%s' como placeholder
+        return f"DATE_FORMAT({col}, '%Y-%m-%d %H:%i:%S')"
+
+    def entero(self, expr):
+        return f"CAST({expr} AS SIGNED)"
+
+    def insertar_o_ignorar(self):
+        return "INSERT IGNORE INTO"
+
+    def sin_mayusculas(self, col):
+        # La collation por defecto (*_ci) ya ignora mayúsculas
+        return col
+
+    def empieza_con(self, col):
+        return f"{col} LIKE %s"
+
+    def inicializar(self):
+        # El esquema base viene de sis_control.sql; aquí solo las tablas agregadas después
+        with open(MIGRACIONES_MYSQL, encoding="utf-8") as f:
+            sentencias = _sentencias(f.read())
+        try:
+            with self.sesion() as s:
+                for sql in sentencias:
+                    s.ejecutar(sql)
+        except Exception as e:
+            print("No se pudieron aplicar las migraciones MySQL:", e)
+
+
+class SQLiteAlmacenamiento(Almacenamiento):
+    nombre = "sqlite"
+
+    def __init__(self, ruta=SQLITE_PATH):
+        super().__init__()
+        if ruta == ":memory:":
+            # BD desechable en un archivo temporal con WAL. Una BD en memoria con
+            # cache=shared usa bloqueos por tabla (SQLITE_LOCKED) que busy_timeout no
+            # reintenta, y falla con peticiones concurrentes.
+            carpeta = tempfile.mkdtemp(prefix="sis_control_")
+            self._limpieza = weakref.finalize(self, shutil.rmtree, carpeta, True)
+            ruta = os.path.join(carpeta, "sis_control.db")
+        self.ruta = ruta
+
+    def conectar(self):
+        return getConexionSQLite(self.ruta)
+
+    def _cursor(self, conn):
+        return conn.cursor()
+
+    def _sql(self, sql):
+        return sql.replace("%s", "?")
+
+    def fecha(self, col):
+        return f"strftime('%Y-%m-%d', {col})"
+
+    def fecha_hora(self, col):
+        return f"strftime('%Y-%m-%d %H:%M:%S', {col})"
+
+    def entero(self, expr):
+        return f"CAST({expr} AS INTEGER)"
+
+    def insertar_o_ignorar(self):
+        return "INSERT OR IGNORE INTO"
+
+    def sin_mayusculas(self, col):
+        return f"{col} COLLATE NOCASE"   # usa idx_equipos_etiqueta_nocase
+
+    def empieza_con(self, col):
+        # LIKE ignora mayúsculas (ASCII) como en MySQL y, con ESCAPE, aprovecha
+        # el índice COLLATE NOCASE de la columna (idx_equipos_etiqueta_nocase)
+        return f"{col} LIKE %s ESCAPE '\\'"
+
+    def inicializar(self):
+        with open(ESQUEMA_SQLITE, encoding="utf-8") as f:
+            script = f.read()
+        conn = self.conectar()
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(script)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+BACKENDS = {
+    "mysql": MySQLAlmacenamiento,
+    "sqlite": SQLiteAlmacenamiento,
+}
+
+def crear_almacenamiento(nombre="mysql", **opciones):
+    try:
+        cls = BACKENDS[nombre]
+    except KeyError:
+        raise ValueError(f"Backend de almacenamiento desconocido: {nombre}")
+    return cls(**opciones)
+
+# ------------------------- Repositorios -------------------------
+class Repositorio:
+    tabla = None
+    columnas = "*"
+
+    def __init__(self, db):
+        self.db = db
+
+    def obtener(self, id):
+        return self.db.consultar_uno(f"SELECT {self.columnas} FROM {self.tabla} WHERE id=%s", (id,))
+
+    def actualizar(self, id, fields):
+        set_sql = ", ".join([f"{k}=%s" for k in fields.keys()])
+        params  = list(fields.values()) + [id]
+        return self.db.ejecutar(f"UPDATE {self.tabla} SET {set_sql} WHERE id=%s", params).rowcount
+
+    def eliminar(self, id):
+        return self.db.ejecutar(f"DELETE FROM {self.tabla} WHERE id=%s", (id,)).rowcount > 0
+
+    def _contar(self, sql, params=()):
+        row = self.db.consultar_uno(sql, params)
+        return row["total"] if row else 0
+
+    @staticmethod
+    def _where(where):
+        return ("WHERE " + " AND ".join(where)) if where else ""
+
+
+class LaboratoriosRepo(Repositorio):
+    tabla = "laboratorios"
+    columnas = "id, nombre, ubicacion"
+
+    def listar(self):
+        return self.db.consultar("SELECT id, nombre, ubicacion FROM laboratorios ORDER BY nombre ASC")
+
+
+class UsuariosRepo(Repositorio):
+    tabla = "usuarios"
+    columnas = "id, usuario, contrasena, rol"
+
+    def obtener_por_usuario(self, usuario):
+        return self.db.consultar_uno(
+            "SELECT id, usuario, contrasena, rol FROM usuarios WHERE usuario=%s", (usuario,))
+
+    def crear(self, usuario, contrasena, rol="solo_vista"):
+        return self.db.ejecutar(
+            "INSERT INTO usuarios (usuario, contrasena, rol) VALUES (%s,%s,%s)",
+            (usuario, contrasena, rol)
+        ).lastrowid
+
+
+class EquiposRepo(Repositorio):
+    tabla = "equipos"
+    columnas = "id, etiqueta_activo, laboratorio_id, tipo, marca, modelo, estado"
+
+    def listar(self, laboratorio_id=None, estado=None, tipo=None, marca=None):
+        where, params = [], []
+        if laboratorio_id is not None:
+            where.append("e.laboratorio_id = %s"); params.append(laboratorio_id)
+        if estado:
+            where.append("e.estado = %s"); params.append(estado)
+        if tipo:
+            where.append("e.tipo = %s"); params.append(tipo)
+        if marca:
+            where.append("e.marca = %s"); params.append(marca)
+
+        return self.db.consultar(f"""
+            SELECT e.id, e.etiqueta_activo, e.tipo, e.marca, e.modelo, e.estado,
+                   l.id AS laboratorio_id, l.nombre AS laboratorio
+            FROM equipos e
+            JOIN laboratorios l ON l.id = e.laboratorio_id
+            {self._where(where)}
+            ORDER BY e.id DESC
+        """, params)
+
+    def crear(self, d):
+        return self.db.ejecutar(
+            "INSERT INTO equipos (etiqueta_activo,laboratorio_id,tipo,marca,modelo,estado) "
+            "VALUES (%s,%s,%s,%s,%s,%s)",
+            (d["etiqueta_activo"], d["laboratorio_id"], d.get("tipo"), d.get("marca"),
+             d.get("modelo"), d.get("estado", "operativo"))
+        ).lastrowid
+
+    def buscar_por_prefijo(self, prefijo, limite=20):
+        db = self.db
+        return db.consultar(f"""
+            SELECT e.id, e.etiqueta_activo, e.estado, l.nombre AS laboratorio
+            FROM equipos e
+            JOIN laboratorios l ON l.id = e.laboratorio_id
+            WHERE {db.empieza_con('e.etiqueta_activo')}
+            ORDER BY e.etiqueta_activo ASC
+            LIMIT %s
+        """, (db.patron_prefijo(prefijo), limite))
+
+    def existe_etiqueta(self, etiqueta):
+        return self._contar("SELECT COUNT(*) AS total FROM equipos WHERE etiqueta_activo=%s", (etiqueta,)) > 0
+
+    def buscar_por_etiquetas(self, etiquetas):
+        """Resuelve etiquetas en lotes (join sobre el índice de etiqueta) con su
+        laboratorio, mantenimientos abiertos, última incidencia y última auditoría.
+        Devuelve (encontrados en el orden recibido, etiquetas desconocidas)."""
+        db = self.db
+        por_etiqueta, vistos = {}, {}
+        with db.sesion() as s:
+            for lote in _trozos(etiquetas):
+                filas = s.consultar(f"""
+                    SELECT t.etiqueta AS etiqueta_buscada,
+                           e.id, e.etiqueta_activo, e.tipo, e.marca, e.modelo, e.estado,
+                           l.id AS laboratorio_id, l.nombre AS laboratorio, l.ubicacion
+                    FROM ({_tabla_etiquetas(len(lote))}) t
+                    JOIN equipos e      ON {db.sin_mayusculas('e.etiqueta_activo')} = t.etiqueta
+                    JOIN laboratorios l ON l.id = e.laboratorio_id
+                """, lote)
+                por_id = {}
+                for eq in filas:
+                    buscada = eq.pop("etiqueta_buscada")
+                    if eq["id"] not in vistos:   # varias etiquetas pueden resolver al mismo equipo
+                        eq["mantenimientos_abiertos"] = []
+                        eq["ultima_incidencia"] = None
+                        eq["ultima_auditoria"] = None
+                        vistos[eq["id"]] = por_id[eq["id"]] = eq
+                    por_etiqueta[buscada] = vistos[eq["id"]]
+                if not por_id:
+                    continue
+                ids = list(por_id)
+                en_ids = _marcadores(len(ids))
+
+                for m in s.consultar(f"""
+                    SELECT m.id, m.equipo_id, m.tipo, m.estado,
+                           {db.fecha_hora('m.fecha_apertura')} AS fecha_apertura,
+                           m.descripcion
+                    FROM mantenimientos m
+                    WHERE m.equipo_id IN ({en_ids}) AND m.estado <> 'cerrado'
+                    ORDER BY m.fecha_apertura DESC
+                """, ids):
+                    por_id[m.pop("equipo_id")]["mantenimientos_abiertos"].append(m)
+
+                for i in s.consultar(f"""
+                    SELECT i.id, i.equipo_id, i.severidad,
+                           {db.fecha_hora('i.fecha_reporte')} AS fecha_reporte,
+                           i.descripcion, i.mantenimiento_id
+                    FROM incidencias i
+                    JOIN (SELECT equipo_id, MAX(fecha_reporte) AS ultima
+                          FROM incidencias
+                          WHERE equipo_id IN ({en_ids})
+                          GROUP BY equipo_id) u
+                      ON u.equipo_id = i.equipo_id AND u.ultima = i.fecha_reporte
+                    ORDER BY i.id ASC
+                """, ids):
+                    por_id[i.pop("equipo_id")]["ultima_incidencia"] = i   # en empate gana el id mayor
+
+                for a in s.consultar(f"""
+                    SELECT equipo_id, {db.fecha_hora('MAX(fecha)')} AS ultima
+                    FROM auditorias_inventario
+                    WHERE equipo_id IN ({en_ids})
+                    GROUP BY equipo_id
+                """, ids):
+                    por_id[a["equipo_id"]]["ultima_auditoria"] = a["ultima"]
+
+        encontrados = list({por_etiqueta[e]["id"]: por_etiqueta[e] for e in etiquetas if e in por_etiqueta}.values())
+        desconocidas = [e for e in etiquetas if e not in por_etiqueta]
+        return encontrados, desconocidas
+
+    def auditar_lote(self, etiquetas, estado=None, usuario_id=None, fecha=None):
+        """Marca como auditados (y opcionalmente cambia el estado de) los equipos
+        con esas etiquetas, en lotes y dentro de una sola transacción.
+        Devuelve (equipos antes del cambio, etiquetas desconocidas)."""
+        db = self.db
+        por_etiqueta, previos = {}, {}
+        with db.sesion() as s:
+            for lote in _trozos(etiquetas):
+                filas = s.consultar(f"""
+                    SELECT t.etiqueta AS etiqueta_buscada,
+                           e.id, e.etiqueta_activo, e.laboratorio_id, e.tipo, e.marca, e.modelo, e.estado
+                    FROM ({_tabla_etiquetas(len(lote))}) t
+                    JOIN equipos e ON {db.sin_mayusculas('e.etiqueta_activo')} = t.etiqueta
+                """, lote)
+                # Cada equipo se actualiza y audita una sola vez
+                ids = []
+                for f in filas:
+                    buscada = f.pop("etiqueta_buscada")
+                    if f["id"] not in previos:
+                        previos[f["id"]] = f
+                        ids.append(f["id"])
+                    por_etiqueta[buscada] = previos[f["id"]]
+                if not ids:
+                    continue
+                if estado:
+                    s.ejecutar(
+                        f"UPDATE equipos SET estado=%s WHERE id IN ({_marcadores(len(ids))})", [estado] + ids)
+                if fecha:
+                    s.ejecutar(
+                        "INSERT INTO auditorias_inventario (equipo_id, usuario_id, fecha) VALUES "
+                        + ", ".join(["(%s,%s,%s)"] * len(ids)),
+                        [v for i in ids for v in (i, usuario_id, fecha)])
+
+        actualizados = list({por_etiqueta[e]["id"]: por_etiqueta[e] for e in etiquetas if e in por_etiqueta}.values())
+        desconocidas = [e for e in etiquetas if e not in por_etiqueta]
+        return actualizados, desconocidas
+
+    def contar_referencias(self, id):
+        with self.db.sesion() as s:
+            refs = 0
+            for tabla in ("programaciones_mantenimiento", "mantenimientos", "incidencias"):
+                refs += s.consultar_uno(f"SELECT COUNT(*) AS total FROM {tabla} WHERE equipo_id=%s", (id,))["total"]
+            return refs
+
+
+class ProgramacionesRepo(Repositorio):
+    tabla = "programaciones_mantenimiento"
+    columnas = "id, equipo_id, periodicidad_dias, fecha_proxima, fecha_ultima"
+
+    def listar(self, equipo_id=None, laboratorio_id=None, tipo=None, marca=None):
+        where, params = [], []
+        if equipo_id is not None:
+            where.append("p.equipo_id = %s"); params.append(equipo_id)
+        if laboratorio_id is not None:
+            where.append("e.laboratorio_id = %s"); params.append(laboratorio_id)
+        if tipo:
+            where.append("e.tipo = %s"); params.append(tipo)
+        if marca:
+            where.append("e.marca = %s"); params.append(marca)
+
+        db = self.db
+        return db.consultar(f"""
+            SELECT p.id, p.equipo_id, e.etiqueta_activo, e.laboratorio_id, l.nombre AS laboratorio,
+                   p.periodicidad_dias,
+                   {db.fecha('p.fecha_proxima')} AS fecha_proxima,
+                   {db.fecha('p.fecha_ultima')} AS fecha_ultima
+            FROM programaciones_mantenimiento p
+            JOIN equipos e      ON e.id = p.equipo_id
+            JOIN laboratorios l ON l.id = e.laboratorio_id
+            {self._where(where)}
+            ORDER BY p.fecha_proxima ASC
+        """, params)
+
+    def proximas(self, hasta_dias=None, laboratorio_id=None, equipo_id=None, tipo=None, marca=None):
+        where, params = [], []
+        if hasta_dias is not None:
+            where.append("vp.dias_restantes <= %s"); params.append(hasta_dias)
+        if laboratorio_id is not None:
+            where.append("vp.laboratorio_id = %s"); params.append(laboratorio_id)
+        if equipo_id is not None:
+            where.append("vp.equipo_id = %s"); params.append(equipo_id)
+        if tipo:
+            where.append("e.tipo = %s"); params.append(tipo)
+        if marca:
+            where.append("e.marca = %s"); params.append(marca)
+
+        db = self.db
+        return db.consultar(f"""
+            SELECT
+                vp.id, vp.equipo_id, vp.etiqueta_activo,
+                vp.laboratorio_id, vp.laboratorio,
+                vp.periodicidad_dias,
+                {db.fecha('vp.fecha_proxima')} AS fecha_proxima,
+                {db.entero('vp.dias_restantes')} AS dias_restantes
+            FROM vista_programaciones_proximas vp
+            JOIN equipos e ON e.id = vp.equipo_id
+            {self._where(where)}
+            ORDER BY vp.fecha_proxima ASC
+            LIMIT 200
+        """, params)
+
+    def listar_vencimientos(self):
+        return self.db.consultar(
+            f"SELECT id, {self.db.fecha('fecha_proxima')} AS fecha_proxima FROM programaciones_mantenimiento")
+
+    def obtener_detalle(self, id):
+        db = self.db
+        return db.consultar_uno(f"""
+            SELECT p.id, p.equipo_id, e.etiqueta_activo, e.laboratorio_id, l.nombre AS laboratorio,
+                   p.periodicidad_dias,
+                   {db.fecha('p.fecha_proxima')} AS fecha_proxima
+            FROM programaciones_mantenimiento p
+            JOIN equipos e      ON e.id = p.equipo_id
+            JOIN laboratorios l ON l.id = e.laboratorio_id
+            WHERE p.id = %s
+        """, (id,))
+
+    def crear(self, d):
+        return self.db.ejecutar(
+            "INSERT INTO programaciones_mantenimiento (equipo_id,periodicidad_dias,fecha_proxima,fecha_ultima) "
+            "VALUES (%s,%s,%s,%s)",
+            (d["equipo_id"], d["periodicidad_dias"], d["fecha_proxima"], d.get("fecha_ultima"))
+        ).lastrowid
+
+
+class MantenimientosRepo(Repositorio):
+    tabla = "mantenimientos"
+    columnas = "id, equipo_id, tipo, fecha_apertura, fecha_cierre, estado, descripcion"
+
+    def listar(self, equipo_id=None, estado=None, tipo=None, desde=None, hasta=None):
+        where, params = [], []
+        if equipo_id is not None:
+            where.append("m.equipo_id = %s"); params.append(equipo_id)
+        if estado:
+            where.append("m.estado = %s"); params.append(estado)
+        if tipo:
+            where.append("m.tipo = %s"); params.append(tipo)
+        if desde:
+            where.append("m.fecha_apertura >= %s"); params.append(desde + " 00:00:00")
+        if hasta:
+            where.append("m.fecha_apertura <= %s"); params.append(hasta + " 23:59:59")
+
+        db = self.db
+        return db.consultar(f"""
+            SELECT
+                m.id, m.equipo_id, e.etiqueta_activo,
+                m.tipo, m.estado,
+                {db.fecha_hora('m.fecha_apertura')} AS fecha_apertura,
+                {db.fecha_hora('m.fecha_cierre')} AS fecha_cierre,
+                m.descripcion
+            FROM mantenimientos m
+            JOIN equipos e ON e.id = m.equipo_id
+            {self._where(where)}
+            ORDER BY m.fecha_apertura DESC
+            LIMIT 300
+        """, params)
+
+    def crear(self, d):
+        return self.db.ejecutar("""
+            INSERT INTO mantenimientos (equipo_id, tipo, fecha_apertura, fecha_cierre, estado, descripcion)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (
+            d["equipo_id"], d["tipo"], d["fecha_apertura"],
+            d.get("fecha_cierre"), d.get("estado", "abierto"), d.get("descripcion")
+        )).lastrowid
+
+    def contar_incidencias(self, id):
+        return self._contar("SELECT COUNT(*) AS total FROM incidencias WHERE mantenimiento_id=%s", (id,))
+
+
+class IncidenciasRepo(Repositorio):
+    tabla = "incidencias"
+    columnas = "id, equipo_id, reportada_por, fecha_reporte, severidad, descripcion, mantenimiento_id"
+
+    def listar(self, equipo_id=None, severidad=None, mantenimiento_id=None, desde=None, hasta=None):
+        where, params = [], []
+        if equipo_id is not None:
+            where.append("i.equipo_id = %s"); params.append(equipo_id)
+        if severidad:
+            where.append("i.severidad = %s"); params.append(severidad)
+        if mantenimiento_id is not None:
+            where.append("i.mantenimiento_id = %s"); params.append(mantenimiento_id)
+        if desde:
+            where.append("i.fecha_reporte >= %s"); params.append(desde + " 00:00:00")
+        if hasta:
+            where.append("i.fecha_reporte <= %s"); params.append(hasta + " 23:59:59")
+
+        db = self.db
+        return db.consultar(f"""
+            SELECT
+                i.id, i.equipo_id, e.etiqueta_activo,
+                i.mantenimiento_id,
+                i.severidad,
+                {db.fecha_hora('i.fecha_reporte')} AS fecha_reporte,
+                i.descripcion,
+                i.reportada_por, u.usuario AS reportada_por_usuario
+            FROM incidencias i
+            JOIN equipos   e ON e.id = i.equipo_id
+            LEFT JOIN usuarios u ON u.id = i.reportada_por
+            {self._where(where)}
+            ORDER BY i.fecha_reporte DESC
+            LIMIT 300
+        """, params)
+
+    def crear(self, d):
+        return self.db.ejecutar("""
+            INSERT INTO incidencias (equipo_id, reportada_por, fecha_reporte, severidad, descripcion, mantenimiento_id)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (
+            d["equipo_id"], d.get("reportada_por"),
+            d["fecha_reporte"], d["severidad"], d.get("descripcion"),
+            d.get("mantenimiento_id")
+        )).lastrowid
+
+
+class AlertasRepo(Repositorio):
+    tabla = "alertas"
+    columnas = "id, programacion_id, equipo_id, tipo, fecha_proxima, fecha_alerta, mensaje"
+
+    def listar(self, tipo=None, equipo_id=None, programacion_id=None, limite=200):
+        where, params = [], []
+        if tipo:
+            where.append("a.tipo = %s"); params.append(tipo)
+        if equipo_id is not None:
+            where.append("a.equipo_id = %s"); params.append(equipo_id)
+        if programacion_id is not None:
+            where.append("a.programacion_id = %s"); params.append(programacion_id)
+        params.append(limite)
+
+        db = self.db
+        return db.consultar(f"""
+            SELECT
+                a.id, a.programacion_id, a.equipo_id, e.etiqueta_activo,
+                a.tipo,
+                {db.fecha('a.fecha_proxima')} AS fecha_proxima,
+                {db.fecha_hora('a.fecha_alerta')} AS fecha_alerta,
+                a.mensaje
+            FROM alertas a
+            LEFT JOIN equipos e ON e.id = a.equipo_id
+            {self._where(where)}
+            ORDER BY a.fecha_alerta DESC, a.id DESC
+            LIMIT %s
+        """, params)
+
+    def registrar(self, a):
+        """Inserta la alerta; devuelve False si ya existía (misma programación, tipo y fecha)."""
+        return self.db.ejecutar(f"""
+            {self.db.insertar_o_ignorar()} alertas
+                (programacion_id, equipo_id, tipo, fecha_proxima, fecha_alerta, mensaje)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (
+            a["programacion_id"], a["equipo_id"], a["tipo"],
+            a["fecha_proxima"], a["fecha_alerta"], a.get("mensaje")
+        )).rowcount > 0
+
+
+class AuditoriaRepo(Repositorio):
+    tabla = "audit_log"
+    columnas = "id, entidad, entidad_id, accion, usuario_id, fecha, cambios"
+
+    def registrar_lote(self, filas):
+        """Inserta los registros con INSERT multi-fila (TAM_LOTE filas por sentencia)."""
+        with self.db.sesion() as s:
+            for lote in _trozos(filas):
+                s.ejecutar(
+                    "INSERT INTO audit_log (entidad, entidad_id, accion, usuario_id, fecha, cambios) VALUES "
+                    + ", ".join(["(%s,%s,%s,%s,%s,%s)"] * len(lote)),
+                    [v for f in lote for v in (
+                        f["entidad"], f["entidad_id"], f["accion"], f.get("usuario_id"),
+                        f["fecha"], json.dumps(f["cambios"], ensure_ascii=False, default=str),
+                    )])
+        return len(filas)
+
+    def historial(self, entidad, entidad_id, limite=200):
+        db = self.db
+        filas = db.consultar(f"""
+            SELECT a.id, a.accion, a.usuario_id, u.usuario,
+                   {db.fecha_hora('a.fecha')} AS fecha, a.cambios
+            FROM audit_log a
+            LEFT JOIN usuarios u ON u.id = a.usuario_id
+            WHERE a.entidad = %s AND a.entidad_id = %s
+            ORDER BY a.fecha DESC, a.id DESC
+            LIMIT %s
+        """, (entidad, entidad_id, limite))
+        for f in filas:
+            f["cambios"] = json.loads(f["cambios"])
+        return filas
@@ -1,15 +1,33 @@
-
-from flask import Flask, request, jsonify, session, redirect, url_for, render_template
+from flask import Flask, Blueprint, current_app, request, jsonify, session, redirect, url_for, render_template
 from functools import wraps
-from conexion import getConexion
+from datetime import datetime
+from conexion import DB_BACKEND, SQLITE_PATH
+from almacenamiento import crear_almacenamiento
+from coalescencia import SingleFlight
+from alertas import (ALERTAS_ACTIVAS, ALERTAS_DIAS_AVISO, ALERTAS_ARCHIVO, ALERTAS_WEBHOOK_URL,
+                     crear_motor_alertas)
+from auditoria import (AUDITORIA_ACTIVA, AUDITORIA_COLA_MAX, AUDITORIA_LOTE, AUDITORIA_INTERVALO,
+                       crear_registro_auditoria)
 
-app = Flask(__name__)
-app.secret_key = "llave_ultra_secreta"
+bp = Blueprint("sistema", __name__)
 
 # ------------------------- Utilidades -------------------------
 def json_error(message, status=400):
     return jsonify({"error": message}), status
 
+def get_almacen():
+    return current_app.extensions["almacenamiento"]
+
+def get_alertas():
+    # None si el motor de alertas está desactivado (ALERTAS_ACTIVAS=0)
+    return current_app.extensions.get("alertas")
+
+def auditar(entidad, entidad_id, antes, despues, accion="editar"):
+    # Encola el diff en el historial (no escribe en la BD en el hilo de la petición)
+    registro = current_app.extensions.get("auditoria")
+    if registro is not None:
+        registro.registrar(entidad, entidad_id, antes, despues, session.get("user_id"), accion)
+
 def require_auth(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
@@ -31,58 +49,71 @@ def require_admin(f):
         return f(*args, **kwargs)
     return wrapper
 
-def ensure_admin_user():
+def single_flight(f):
+    """Peticiones concurrentes idénticas (endpoint, filtros, rol) comparten una
+    sola consulta y su respuesta ya serializada. Va después de require_auth.
+
+    La clave incluye el contador de escrituras (ver contar_escritura), así que
+    una lectura que llega después de un POST/PUT/DELETE ya respondido no recibe
+    datos de antes. Límite: solo ve las escrituras de este proceso; con varios
+    workers o cambios hechos directo en la BD una lectura puede unirse a un
+    vuelo que empezó antes del cambio (como mucho, la duración de una consulta).
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        sf = current_app.extensions.get("singleflight")
+        if sf is None:
+            return f(*args, **kwargs)
+        # Los handlers leen solo el primer valor de cada parámetro (request.args.get):
+        # la clave usa ese mismo valor, y un valor vacío equivale a no filtrar
+        filtros = tuple(sorted((k, v) for k, v in request.args.items() if v != ""))
+        clave = (request.endpoint, tuple(sorted(kwargs.items())), filtros, session.get("rol"), sf.generacion)
+
+        def consultar():
+            resp = current_app.make_response(f(*args, **kwargs))
+            return resp.get_data(), resp.status_code, resp.mimetype
+
+        body, status_code, mimetype = sf.ejecutar(clave, consultar, grupo=request.endpoint)
+        return current_app.response_class(body, status=status_code, mimetype=mimetype)
+    return wrapper
+
+NO_ESCRIBEN = {"sistema.login", "sistema.logout", "sistema.lookup_equipos"}
+
+@bp.after_request
+def contar_escritura(resp):
+    # Tras confirmar una escritura (antes de responder) invalida los vuelos en curso
+    if (request.method in ("POST", "PUT", "DELETE") and resp.status_code < 400
+            and request.endpoint not in NO_ESCRIBEN):
+        sf = current_app.extensions.get("singleflight")
+        if sf is not None:
+            sf.registrar_escritura()
+    return resp
+
+def ensure_admin_user(almacen):
     """Garantiza que exista usuario admin/admin"""
-    conn = None
-    cur = None
     try:
-        conn = getConexion()
-        cur = conn.cursor(buffered=True, dictionary=True)
-        cur.execute("SELECT id FROM usuarios WHERE usuario=%s", ("admin",))
-        row = cur.fetchone()
-        if not row:
-            cur.close()
-            cur = conn.cursor()
-            cur.execute(
-                "INSERT INTO usuarios (usuario, contrasena, rol) VALUES (%s,%s,%s)",
-                ("admin", "admin", "admin")
-            )
-            conn.commit()
+        if not almacen.usuarios.obtener_por_usuario("admin"):
+            almacen.usuarios.crear("admin", "admin", "admin")
     except Exception as e:
-        try:
-            if conn: conn.rollback()
-        except:
-            pass
         print("No se pudo crear admin:", e)
-    finally:
-        try:
-            if cur: cur.close()
-            if conn: conn.close()
-        except:
-            pass
 
 # ------------------------- Salud -------------------------
-@app.get("/status")
+@bp.get("/status")
 def status():
     try:
-        conn = getConexion()
-        cur = conn.cursor()
-        cur.execute("SELECT 1")
-        cur.fetchone()
-        cur.close()
-        conn.close()
-        return jsonify({"status": "ok", "db": "conectada"}), 200
+        get_almacen().ping()
+        return jsonify({"status": "ok", "db": "conectada", "backend": get_almacen().nombre}), 200
     except Exception as e:
         return jsonify({"status": "error", "db_error": str(e)}), 500
 
-@app.get("/")
+@bp.get("/")
 def root_redirect():
     if session.get("user_id"):
-        return redirect(url_for("ui"))
-    return redirect(url_for("login_ui"))
+        return redirect(url_for(".ui"))
+    return redirect(url_for(".login_ui"))
 
 # ------------------------- Auth -------------------------
-@app.post("/login")
+@bp.post("/login")
 def login():
     datos = request.json or {}
     usuario = datos.get("usuario") or datos.get("username")
@@ -90,12 +121,7 @@ def login():
     if not usuario or not contrasena:
         return json_error("usuario y contrasena son obligatorios", 400)
 
-    conn = getConexion()
-    cur = conn.cursor(buffered=True, dictionary=True)
-    cur.execute("SELECT id, usuario, contrasena, rol FROM usuarios WHERE usuario=%s", (usuario,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    row = get_almacen().usuarios.obtener_por_usuario(usuario)
 
     if not row or row["contrasena"] != contrasena:
         return json_error("Credenciales inválidas", 401)
@@ -105,13 +131,13 @@ def login():
     session["rol"] = row["rol"]
     return jsonify({"mensaje": "Login correcto", "usuario": row}), 200
 
-@app.post("/logout")
+@bp.post("/logout")
 @require_auth
 def logout():
     session.clear()
     return jsonify({"mensaje": "Logout correcto"}), 200
 
-@app.get("/me")
+@bp.get("/me")
 def me():
     if not session.get("user_id"):
         return jsonify({"autenticado": False}), 200
@@ -125,64 +151,103 @@ def me():
     }), 200
 
 # ------------------------- Catálogos -------------------------
-@app.get("/laboratorios")
+@bp.get("/laboratorios")
 @require_auth
+@single_flight
 def listar_laboratorios():
-    conn = getConexion()
-    cur = conn.cursor(buffered=True, dictionary=True)
-    cur.execute("SELECT id, nombre, ubicacion FROM laboratorios ORDER BY nombre ASC")
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
+    data = get_almacen().laboratorios.listar()
     return jsonify(data), 200
 
 # ------------------------- Equipos -------------------------
-@app.get("/equipos")
+@bp.get("/equipos")
 @require_auth
+@single_flight
 def listar_equipos():
-    conn = None
-    cur = None
     try:
-        laboratorio_id = request.args.get("laboratorio_id", type=int)
-        estado         = request.args.get("estado", type=str)
-        tipo           = request.args.get("tipo",   type=str)
-        marca          = request.args.get("marca",  type=str)
-
-        where, params = [], []
-        if laboratorio_id is not None:
-            where.append("e.laboratorio_id = %s"); params.append(laboratorio_id)
-        if estado:
-            where.append("e.estado = %s"); params.append(estado)
-        if tipo:
-            where.append("e.tipo = %s"); params.append(tipo)
-        if marca:
-            where.append("e.marca = %s"); params.append(marca)
-
-        where_clause = ("WHERE " + " AND ".join(where)) if where else ""
-
-        conn = getConexion()
-        cur  = conn.cursor(buffered=True, dictionary=True)
-        sql = f"""
-            SELECT e.id, e.etiqueta_activo, e.tipo, e.marca, e.modelo, e.estado,
-                   l.id AS laboratorio_id, l.nombre AS laboratorio
-            FROM equipos e
-            JOIN laboratorios l ON l.id = e.laboratorio_id
-            {where_clause}
-            ORDER BY e.id DESC
-        """
-        cur.execute(sql, tuple(params))
-        data = cur.fetchall()
+        data = get_almacen().equipos.listar(
+            laboratorio_id = request.args.get("laboratorio_id", type=int),
+            estado         = request.args.get("estado", type=str),
+            tipo           = request.args.get("tipo",   type=str),
+            marca          = request.args.get("marca",  type=str),
+        )
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            if cur: cur.close()
-            if conn: conn.close()
-        except:
-            pass
-
-@app.post("/equipos")
+
+@bp.get("/equipos/buscar")
+@require_auth
+@single_flight
+def buscar_equipos():
+    """Autocompletado por prefijo de etiqueta_activo (usa el índice único)."""
+    prefijo = (request.args.get("prefijo", type=str) or "").strip()
+    limite  = max(1, min(request.args.get("limite", default=20, type=int), 100))
+    if not prefijo:
+        return jsonify([]), 200
+    try:
+        data = get_almacen().equipos.buscar_por_prefijo(prefijo, limite)
+        return jsonify(data), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+MAX_ETIQUETAS_LOTE = 5000
+ESTADOS_EQUIPO = {"operativo", "programado", "en_mantenimiento", "de_baja"}
+
+def leer_etiquetas(d):
+    """Normaliza la lista 'etiquetas' del body: recorta, descarta vacías y duplicados (conserva orden)."""
+    etiquetas = d.get("etiquetas")
+    if not isinstance(etiquetas, list):
+        return None
+    return list(dict.fromkeys(str(e).strip() for e in etiquetas if e is not None and str(e).strip()))
+
+@bp.post("/equipos/lookup")
+@require_auth
+def lookup_equipos():
+    """Resolución por lote de etiquetas escaneadas (recorridos de auditoría)."""
+    etiquetas = leer_etiquetas(request.json or {})
+    if etiquetas is None:
+        return json_error("Se requiere 'etiquetas' (lista)")
+    if len(etiquetas) > MAX_ETIQUETAS_LOTE:
+        return json_error(f"Máximo {MAX_ETIQUETAS_LOTE} etiquetas por petición")
+    try:
+        encontrados, desconocidas = get_almacen().equipos.buscar_por_etiquetas(etiquetas)
+        return jsonify({"encontrados": encontrados, "desconocidas": desconocidas}), 200
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@bp.post("/equipos/auditar")
+@require_admin
+def auditar_equipos():
+    """Marca como auditados y/o cambia el estado de varios equipos en una transacción."""
+    d = request.json or {}
+    etiquetas = leer_etiquetas(d)
+    if etiquetas is None:
+        return json_error("Se requiere 'etiquetas' (lista)")
+    if len(etiquetas) > MAX_ETIQUETAS_LOTE:
+        return json_error(f"Máximo {MAX_ETIQUETAS_LOTE} etiquetas por petición")
+    estado = d.get("estado")
+    if estado is not None and estado not in ESTADOS_EQUIPO:
+        return json_error(f"Estado inválido. Use: {', '.join(sorted(ESTADOS_EQUIPO))}")
+    auditado = bool(d.get("auditado", True))
+    if not estado and not auditado:
+        return json_error("Sin cambios: indique 'estado' o 'auditado'")
+
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S") if auditado else None
+    try:
+        actualizados, desconocidas = get_almacen().equipos.auditar_lote(
+            etiquetas, estado=estado, usuario_id=session["user_id"], fecha=fecha)
+        if estado:
+            for eq in actualizados:
+                auditar("equipo", eq["id"], eq, {"estado": estado}, accion="auditar")
+        return jsonify({
+            "mensaje": "Equipos actualizados",
+            "actualizados": len(actualizados),
+            "auditados": len(actualizados) if auditado else 0,
+            "desconocidas": desconocidas,
+        }), 200
+    except Exception as e:
+        return json_error(str(e))
+
+@bp.post("/equipos")
 @require_admin
 def crear_equipo():
     d = request.json or {}
@@ -190,26 +255,14 @@ def crear_equipo():
     if any(k not in d for k in required):
         return json_error(f"Campos obligatorios: {', '.join(required)}")
 
-    conn = getConexion()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "INSERT INTO equipos (etiqueta_activo,laboratorio_id,tipo,marca,modelo,estado) "
-            "VALUES (%s,%s,%s,%s,%s,%s)",
-            (d["etiqueta_activo"], d["laboratorio_id"], d.get("tipo"), d.get("marca"),
-             d.get("modelo"), d.get("estado", "operativo"))
-        )
-        conn.commit()
-        return jsonify({"mensaje": "Equipo creado", "id": cur.lastrowid}), 201
+        nuevo_id = get_almacen().equipos.crear(d)
+        return jsonify({"mensaje": "Equipo creado", "id": nuevo_id}), 201
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
 # USAMOS route(..., methods=['PUT']) para máxima compatibilidad
-@app.route("/equipos/<int:id>", methods=["PUT"])
+@bp.route("/equipos/<int:id>", methods=["PUT"])
 @require_admin
 def editar_equipo(id):
     d = request.json or {}
@@ -218,121 +271,68 @@ def editar_equipo(id):
     if not fields:
         return json_error("Sin cambios: no se enviaron campos permitidos", 400)
 
-    conn = getConexion()
-    cur  = conn.cursor(buffered=True, dictionary=True)
+    equipos = get_almacen().equipos
     try:
         # Verificar existencia y etiqueta actual
-        cur.execute("SELECT id, etiqueta_activo FROM equipos WHERE id=%s", (id,))
-        eq = cur.fetchone()
+        eq = equipos.obtener(id)
         if not eq:
             return json_error("Equipo no encontrado", 404)
 
         # Si se cambia etiqueta, validar uniqueness
         if "etiqueta_activo" in fields and fields["etiqueta_activo"] != eq["etiqueta_activo"]:
-            cur_check = conn.cursor()
-            cur_check.execute("SELECT COUNT(*) FROM equipos WHERE etiqueta_activo=%s", (fields["etiqueta_activo"],))
-            (exists,) = cur_check.fetchone()
-            cur_check.close()
-            if exists:
+            if equipos.existe_etiqueta(fields["etiqueta_activo"]):
                 return json_error("La etiqueta ya existe", 409)
 
-        # Armar UPDATE dinámico
-        set_parts = []
-        params = []
-        for k, v in fields.items():
-            set_parts.append(f"{k}=%s"); params.append(v)
-        params.append(id)
-
-        cur2 = conn.cursor()
-        cur2.execute(f"UPDATE equipos SET {', '.join(set_parts)} WHERE id=%s", tuple(params))
-        conn.commit()
+        equipos.actualizar(id, fields)
+        auditar("equipo", id, eq, fields)
         return jsonify({"mensaje": "Equipo actualizado", "id": id}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        try: cur.close()
-        except: pass
-        conn.close()
 
-@app.delete("/equipos/<int:id>")
+@bp.get("/equipos/<int:id>/historial")
+@require_auth
+@single_flight
+def historial_equipo(id):
+    """Cambios registrados del equipo, del más reciente al más antiguo."""
+    limite = max(1, min(request.args.get("limite", default=200, type=int), 1000))
+    try:
+        data = get_almacen().auditoria.historial("equipo", id, limite)
+        return jsonify(data), 200
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@bp.delete("/equipos/<int:id>")
 @require_admin
 def eliminar_equipo(id):
-    conn = getConexion()
-    cur  = conn.cursor()
+    equipos = get_almacen().equipos
     try:
         # Verificar referencias
-        refs = 0
-        cur.execute("SELECT COUNT(*) FROM programaciones_mantenimiento WHERE equipo_id=%s", (id,))
-        refs += cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM mantenimientos WHERE equipo_id=%s", (id,))
-        refs += cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM incidencias WHERE equipo_id=%s", (id,))
-        refs += cur.fetchone()[0]
-
-        if refs > 0:
+        if equipos.contar_referencias(id) > 0:
             return json_error(
                 "No se puede eliminar: el equipo tiene referencias (programaciones/mantenimientos/incidencias). "
                 "Sugerencia: cambiar estado a 'de_baja'.", 409
             )
 
-        cur.execute("DELETE FROM equipos WHERE id=%s", (id,))
-        if cur.rowcount == 0:
-            conn.rollback()
+        if not equipos.eliminar(id):
             return json_error("Equipo no encontrado", 404)
-
-        conn.commit()
         return jsonify({"mensaje":"Equipo eliminado"}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
 # ------------------------- Programaciones -------------------------
-@app.get("/programaciones")
+@bp.get("/programaciones")
 @require_auth
+@single_flight
 def listar_programaciones():
-    equipo_id      = request.args.get("equipo_id", type=int)
-    laboratorio_id = request.args.get("laboratorio_id", type=int)
-    tipo           = request.args.get("tipo", type=str)
-    marca          = request.args.get("marca", type=str)
-
-    where, params = [], []
-    if equipo_id is not None:
-        where.append("p.equipo_id = %s"); params.append(equipo_id)
-    if laboratorio_id is not None:
-        where.append("e.laboratorio_id = %s"); params.append(laboratorio_id)
-    if tipo:
-        where.append("e.tipo = %s"); params.append(tipo)
-    if marca:
-        where.append("e.marca = %s"); params.append(marca)
-
-    where_clause = ("WHERE " + " AND ".join(where)) if where else ""
-
-    conn = getConexion()
-    cur = conn.cursor(buffered=True, dictionary=True)
-    cur.execute(
-        f"""
-        SELECT p.id, p.equipo_id, e.etiqueta_activo, e.laboratorio_id, l.nombre AS laboratorio,
-               p.periodicidad_dias,
-               DATE_FORMAT(p.fecha_proxima, '%Y-%m-%d') AS fecha_proxima,
-               DATE_FORMAT(p.fecha_ultima,  '%Y-%m-%d') AS fecha_ultima
-        FROM programaciones_mantenimiento p
-        JOIN equipos e      ON e.id = p.equipo_id
-        JOIN laboratorios l ON l.id = e.laboratorio_id
-        {where_clause}
-        ORDER BY p.fecha_proxima ASC
-        """,
-        tuple(params)
+    data = get_almacen().programaciones.listar(
+        equipo_id      = request.args.get("equipo_id", type=int),
+        laboratorio_id = request.args.get("laboratorio_id", type=int),
+        tipo           = request.args.get("tipo", type=str),
+        marca          = request.args.get("marca", type=str),
     )
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
     return jsonify(data), 200
 
-@app.post("/programaciones")
+@bp.post("/programaciones")
 @require_admin
 def crear_programacion():
     d = request.json or {}
@@ -340,24 +340,15 @@ def crear_programacion():
     if any(k not in d for k in required):
         return json_error(f"Campos obligatorios: {', '.join(required)}")
 
-    conn = getConexion()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "INSERT INTO programaciones_mantenimiento (equipo_id,periodicidad_dias,fecha_proxima,fecha_ultima) "
-            "VALUES (%s,%s,%s,%s)",
-            (d["equipo_id"], d["periodicidad_dias"], d["fecha_proxima"], d.get("fecha_ultima"))
-        )
-        conn.commit()
-        return jsonify({"mensaje": "Programación creada", "id": cur.lastrowid}), 201
+        nuevo_id = get_almacen().programaciones.crear(d)
+        motor = get_alertas()
+        if motor: motor.programar(nuevo_id, d["fecha_proxima"])
+        return jsonify({"mensaje": "Programación creada", "id": nuevo_id}), 201
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.route("/programaciones/<int:id>", methods=["PUT"])
+@bp.route("/programaciones/<int:id>", methods=["PUT"])
 @require_admin
 def editar_programacion(id):
     d = request.json or {}
@@ -368,159 +359,89 @@ def editar_programacion(id):
     if not fields:
         return json_error("Sin cambios: no se enviaron campos a actualizar", 400)
 
-    conn = getConexion()
-    cur  = conn.cursor()
+    programaciones = get_almacen().programaciones
     try:
-        cur.execute("SELECT id FROM programaciones_mantenimiento WHERE id=%s", (id,))
-        row = cur.fetchone()
-        if not row:
+        if not programaciones.obtener(id):
             return json_error("Programación no encontrada", 404)
 
-        set_parts = []
-        params = []
-        for k, v in fields.items():
-            set_parts.append(f"{k}=%s"); params.append(v)
-        params.append(id)
-
-        cur.execute(f"UPDATE programaciones_mantenimiento SET {', '.join(set_parts)} WHERE id=%s", tuple(params))
-        conn.commit()
+        programaciones.actualizar(id, fields)
+        motor = get_alertas()
+        if motor and "fecha_proxima" in fields: motor.programar(id, fields["fecha_proxima"])
         return jsonify({"mensaje": "Programación actualizada", "id": id}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.delete("/programaciones/<int:id>")
+@bp.delete("/programaciones/<int:id>")
 @require_admin
 def eliminar_programacion(id):
-    conn = getConexion()
-    cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM programaciones_mantenimiento WHERE id=%s", (id,))
-        if cur.rowcount == 0:
-            conn.rollback()
+        if not get_almacen().programaciones.eliminar(id):
             return json_error("Programación no encontrada", 404)
-        conn.commit()
+        motor = get_alertas()
+        if motor: motor.quitar(id)
         return jsonify({"mensaje":"Programación eliminada"}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
 # ------------------------- Programaciones próximas (vista) -------------------------
-@app.get("/programaciones/proximas")
+@bp.get("/programaciones/proximas")
 @require_auth
+@single_flight
 def programaciones_proximas():
-    conn = None
-    cur = None
     try:
-        laboratorio_id = request.args.get("laboratorio_id", type=int)
-        equipo_id      = request.args.get("equipo_id", type=int)
-        hasta_dias     = request.args.get("hasta_dias", default=60, type=int)
-        tipo           = request.args.get("tipo", type=str)
-        marca          = request.args.get("marca", type=str)
-
-        where, params = [], []
-        if hasta_dias is not None:
-            where.append("vp.dias_restantes <= %s"); params.append(hasta_dias)
-        if laboratorio_id is not None:
-            where.append("vp.laboratorio_id = %s"); params.append(laboratorio_id)
-        if equipo_id is not None:
-            where.append("vp.equipo_id = %s"); params.append(equipo_id)
-        if tipo:
-            where.append("e.tipo = %s"); params.append(tipo)
-        if marca:
-            where.append("e.marca = %s"); params.append(marca)
-
-        where_clause = ("WHERE " + " AND ".join(where)) if where else ""
-
-        conn = getConexion()
-        cur  = conn.cursor(buffered=True, dictionary=True)
-        cur.execute(
-            f"""
-            SELECT 
-                vp.id, vp.equipo_id, vp.etiqueta_activo, 
-                vp.laboratorio_id, vp.laboratorio,
-                vp.periodicidad_dias, 
-                DATE_FORMAT(vp.fecha_proxima, '%Y-%m-%d') AS fecha_proxima,
-                CAST(vp.dias_restantes AS SIGNED) AS dias_restantes
-            FROM vista_programaciones_proximas vp
-            JOIN equipos e ON e.id = vp.equipo_id
-            {where_clause}
-            ORDER BY vp.fecha_proxima ASC
-            LIMIT 200
-            """,
-            tuple(params)
+        data = get_almacen().programaciones.proximas(
+            laboratorio_id = request.args.get("laboratorio_id", type=int),
+            equipo_id      = request.args.get("equipo_id", type=int),
+            hasta_dias     = request.args.get("hasta_dias", default=60, type=int),
+            tipo           = request.args.get("tipo", type=str),
+            marca          = request.args.get("marca", type=str),
         )
-        data = cur.fetchall()
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            if cur: cur.close()
-            if conn: conn.close()
-        except:
-            pass
+
+# ------------------------- Alertas -------------------------
+@bp.get("/alertas")
+@require_auth
+@single_flight
+def listar_alertas():
+    try:
+        data = get_almacen().alertas.listar(
+            tipo            = request.args.get("tipo", type=str),              # proxima/vencida
+            equipo_id       = request.args.get("equipo_id", type=int),
+            programacion_id = request.args.get("programacion_id", type=int),
+            limite          = max(1, min(request.args.get("limite", default=200, type=int), 1000)),
+        )
+        return jsonify(data), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.get("/alertas/motor")
+@require_admin
+def estado_motor_alertas():
+    motor = get_alertas()
+    if not motor:
+        return jsonify({"activo": False}), 200
+    return jsonify({"activo": True, **motor.estado()}), 200
 
 # ------------------------- Mantenimientos -------------------------
-@app.get("/mantenimientos")
+@bp.get("/mantenimientos")
 @require_auth
+@single_flight
 def listar_mantenimientos():
-    conn = None
-    cur = None
     try:
-        equipo_id = request.args.get("equipo_id", type=int)
-        estado    = request.args.get("estado", type=str)          # abierto/en_proceso/cerrado
-        tipo      = request.args.get("tipo", type=str)            # preventivo/correctivo
-        desde     = request.args.get("desde", type=str)           # YYYY-MM-DD
-        hasta     = request.args.get("hasta", type=str)           # YYYY-MM-DD
-
-        where, params = [], []
-        if equipo_id is not None:
-            where.append("m.equipo_id = %s"); params.append(equipo_id)
-        if estado:
-            where.append("m.estado = %s"); params.append(estado)
-        if tipo:
-            where.append("m.tipo = %s"); params.append(tipo)
-        if desde:
-            where.append("m.fecha_apertura >= %s"); params.append(desde + " 00:00:00")
-        if hasta:
-            where.append("m.fecha_apertura <= %s"); params.append(hasta + " 23:59:59")
-
-        where_clause = ("WHERE " + " AND ".join(where)) if where else ""
-
-        conn = getConexion()
-        cur  = conn.cursor(buffered=True, dictionary=True)
-        cur.execute(f"""
-            SELECT 
-                m.id, m.equipo_id, e.etiqueta_activo,
-                m.tipo, m.estado,
-                DATE_FORMAT(m.fecha_apertura, '%Y-%m-%d %H:%i:%s') AS fecha_apertura,
-                DATE_FORMAT(m.fecha_cierre,   '%Y-%m-%d %H:%i:%s') AS fecha_cierre,
-                m.descripcion
-            FROM mantenimientos m
-            JOIN equipos e ON e.id = m.equipo_id
-            {where_clause}
-            ORDER BY m.fecha_apertura DESC
-            LIMIT 300
-        """, tuple(params))
-        data = cur.fetchall()
+        data = get_almacen().mantenimientos.listar(
+            equipo_id = request.args.get("equipo_id", type=int),
+            estado    = request.args.get("estado", type=str),          # abierto/en_proceso/cerrado
+            tipo      = request.args.get("tipo", type=str),            # preventivo/correctivo
+            desde     = request.args.get("desde", type=str),           # YYYY-MM-DD
+            hasta     = request.args.get("hasta", type=str),           # YYYY-MM-DD
+        )
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            if cur: cur.close()
-            if conn: conn.close()
-        except:
-            pass
-
-@app.post("/mantenimientos")
+
+@bp.post("/mantenimientos")
 @require_admin
 def crear_mantenimiento():
     d = request.json or {}
@@ -528,26 +449,13 @@ def crear_mantenimiento():
     if any(k not in d for k in required):
         return json_error(f"Campos obligatorios: {', '.join(required)}")
 
-    conn = getConexion()
-    cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO mantenimientos (equipo_id, tipo, fecha_apertura, fecha_cierre, estado, descripcion)
-            VALUES (%s,%s,%s,%s,%s,%s)
-        """, (
-            d["equipo_id"], d["tipo"], d["fecha_apertura"],
-            d.get("fecha_cierre"), d.get("estado", "abierto"), d.get("descripcion")
-        ))
-        conn.commit()
-        return jsonify({"mensaje":"Mantenimiento creado", "id": cur.lastrowid}), 201
+        nuevo_id = get_almacen().mantenimientos.crear(d)
+        return jsonify({"mensaje":"Mantenimiento creado", "id": nuevo_id}), 201
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.route("/mantenimientos/<int:id>", methods=["PUT"])
+@bp.route("/mantenimientos/<int:id>", methods=["PUT"])
 @require_admin
 def editar_mantenimiento(id):
     d = request.json or {}
@@ -556,107 +464,51 @@ def editar_mantenimiento(id):
     if not fields:
         return json_error("Sin cambios: no se enviaron campos permitidos", 400)
 
-    conn = getConexion()
-    cur = conn.cursor()
+    mantenimientos = get_almacen().mantenimientos
     try:
-        cur.execute("SELECT id FROM mantenimientos WHERE id=%s", (id,))
-        if cur.fetchone() is None:
+        previo = mantenimientos.obtener(id)
+        if previo is None:
             return json_error("Mantenimiento no encontrado", 404)
 
-        set_sql = ", ".join([f"{k}=%s" for k in fields.keys()])
-        params  = list(fields.values()) + [id]
-        cur.execute(f"UPDATE mantenimientos SET {set_sql} WHERE id=%s", tuple(params))
-        conn.commit()
+        mantenimientos.actualizar(id, fields)
+        auditar("mantenimiento", id, previo, fields)
         return jsonify({"mensaje":"Mantenimiento actualizado", "id": id}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.delete("/mantenimientos/<int:id>")
+@bp.delete("/mantenimientos/<int:id>")
 @require_admin
 def eliminar_mantenimiento(id):
-    conn = getConexion()
-    cur = conn.cursor()
+    mantenimientos = get_almacen().mantenimientos
     try:
         # Bloquea si está referenciado por incidencias
-        cur.execute("SELECT COUNT(*) FROM incidencias WHERE mantenimiento_id=%s", (id,))
-        (refs,) = cur.fetchone()
-        if refs and refs > 0:
+        if mantenimientos.contar_incidencias(id) > 0:
             return json_error("No se puede eliminar: existen incidencias referenciando este mantenimiento", 409)
 
-        cur.execute("DELETE FROM mantenimientos WHERE id=%s", (id,))
-        if cur.rowcount == 0:
-            conn.rollback()
+        if not mantenimientos.eliminar(id):
             return json_error("Mantenimiento no encontrado", 404)
-
-        conn.commit()
         return jsonify({"mensaje":"Mantenimiento eliminado"}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
 # ------------------------- Incidencias -------------------------
-@app.get("/incidencias")
+@bp.get("/incidencias")
 @require_auth
+@single_flight
 def listar_incidencias():
-    conn = None
-    cur = None
     try:
-        equipo_id        = request.args.get("equipo_id", type=int)
-        severidad        = request.args.get("severidad", type=str)          # baja/media/alta
-        mantenimiento_id = request.args.get("mantenimiento_id", type=int)
-        desde            = request.args.get("desde", type=str)               # YYYY-MM-DD
-        hasta            = request.args.get("hasta", type=str)
-
-        where, params = [], []
-        if equipo_id is not None:
-            where.append("i.equipo_id = %s"); params.append(equipo_id)
-        if severidad:
-            where.append("i.severidad = %s"); params.append(severidad)
-        if mantenimiento_id is not None:
-            where.append("i.mantenimiento_id = %s"); params.append(mantenimiento_id)
-        if desde:
-            where.append("i.fecha_reporte >= %s"); params.append(desde + " 00:00:00")
-        if hasta:
-            where.append("i.fecha_reporte <= %s"); params.append(hasta + " 23:59:59")
-
-        where_clause = ("WHERE " + " AND ".join(where)) if where else ""
-
-        conn = getConexion()
-        cur = conn.cursor(buffered=True, dictionary=True)
-        cur.execute(f"""
-            SELECT
-                i.id, i.equipo_id, e.etiqueta_activo,
-                i.mantenimiento_id,
-                i.severidad,
-                DATE_FORMAT(i.fecha_reporte, '%Y-%m-%d %H:%i:%s') AS fecha_reporte,
-                i.descripcion,
-                i.reportada_por, u.usuario AS reportada_por_usuario
-            FROM incidencias i
-            JOIN equipos   e ON e.id = i.equipo_id
-            LEFT JOIN usuarios u ON u.id = i.reportada_por
-            {where_clause}
-            ORDER BY i.fecha_reporte DESC
-            LIMIT 300
-        """, tuple(params))
-        data = cur.fetchall()
+        data = get_almacen().incidencias.listar(
+            equipo_id        = request.args.get("equipo_id", type=int),
+            severidad        = request.args.get("severidad", type=str),          # baja/media/alta
+            mantenimiento_id = request.args.get("mantenimiento_id", type=int),
+            desde            = request.args.get("desde", type=str),               # YYYY-MM-DD
+            hasta            = request.args.get("hasta", type=str),
+        )
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            if cur: cur.close()
-            if conn: conn.close()
-        except:
-            pass
-
-@app.post("/incidencias")
+
+@bp.post("/incidencias")
 @require_admin
 def crear_incidencia():
     d = request.json or {}
@@ -664,27 +516,13 @@ def crear_incidencia():
     if any(k not in d for k in required):
         return json_error(f"Campos obligatorios: {', '.join(required)}")
 
-    conn = getConexion()
-    cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO incidencias (equipo_id, reportada_por, fecha_reporte, severidad, descripcion, mantenimiento_id)
-            VALUES (%s,%s,%s,%s,%s,%s)
-        """, (
-            d["equipo_id"], d.get("reportada_por"),
-            d["fecha_reporte"], d["severidad"], d.get("descripcion"),
-            d.get("mantenimiento_id")
-        ))
-        conn.commit()
-        return jsonify({"mensaje": "Incidencia creada", "id": cur.lastrowid}), 201
+        nuevo_id = get_almacen().incidencias.crear(d)
+        return jsonify({"mensaje": "Incidencia creada", "id": nuevo_id}), 201
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.route("/incidencias/<int:id>", methods=["PUT"])
+@bp.route("/incidencias/<int:id>", methods=["PUT"])
 @require_admin
 def editar_incidencia(id):
     d = request.json or {}
@@ -693,50 +531,34 @@ def editar_incidencia(id):
     if not fields:
         return json_error("Sin cambios: no se enviaron campos permitidos", 400)
 
-    conn = getConexion()
-    cur = conn.cursor()
+    incidencias = get_almacen().incidencias
     try:
-        cur.execute("SELECT id FROM incidencias WHERE id=%s", (id,))
-        if cur.fetchone() is None:
+        previa = incidencias.obtener(id)
+        if previa is None:
             return json_error("Incidencia no encontrada", 404)
 
-        set_sql = ", ".join([f"{k}=%s" for k in fields.keys()])
-        params = list(fields.values()) + [id]
-        cur.execute(f"UPDATE incidencias SET {set_sql} WHERE id=%s", tuple(params))
-        conn.commit()
+        incidencias.actualizar(id, fields)
+        auditar("incidencia", id, previa, fields)
         return jsonify({"mensaje": "Incidencia actualizada", "id": id}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.delete("/incidencias/<int:id>")
+@bp.delete("/incidencias/<int:id>")
 @require_admin
 def eliminar_incidencia(id):
-    conn = getConexion()
-    cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM incidencias WHERE id=%s", (id,))
-        if cur.rowcount == 0:
-            conn.rollback()
+        if not get_almacen().incidencias.eliminar(id):
             return json_error("Incidencia no encontrada", 404)
-        conn.commit()
         return jsonify({"mensaje": "Incidencia eliminada"}), 200
     except Exception as e:
-        conn.rollback()
         return json_error(str(e))
-    finally:
-        cur.close()
-        conn.close()
 
 # ------------------------- Debug (opcional) -------------------------
-@app.get("/debug/routes")
+@bp.get("/debug/routes")
 @require_admin
 def debug_routes():
     rutas = []
-    for r in app.url_map.iter_rules():
+    for r in current_app.url_map.iter_rules():
         rutas.append({
             "rule": r.rule,
             "endpoint": r.endpoint,
@@ -744,20 +566,108 @@ def debug_routes():
         })
     return jsonify(rutas), 200
 
+@bp.get("/debug/coalescencia")
+@require_admin
+def debug_coalescencia():
+    sf = current_app.extensions.get("singleflight")
+    if sf is None:
+        return jsonify({"activo": False}), 200
+    return jsonify({"activo": True, **sf.metricas()}), 200
+
+@bp.get("/debug/auditoria")
+@require_admin
+def debug_auditoria():
+    registro = current_app.extensions.get("auditoria")
+    if registro is None:
+        return jsonify({"activo": False}), 200
+    return jsonify(registro.metricas()), 200
+
 # ------------------------- UI -------------------------
-@app.get("/login-ui")
+@bp.get("/login-ui")
 def login_ui():
     return render_template("login.html")
 
-@app.get("/ui")
+@bp.get("/ui")
 @require_auth
 def ui():
     return render_template("ui.html")
 
+# ------------------------- App factory -------------------------
+def create_app(config=None):
+    """Crea la app con el backend indicado en config["DB_BACKEND"] (mysql / sqlite).
+
+    Ej. para pruebas o benchmarks en proceso:
+        create_app({"DB_BACKEND": "sqlite", "SQLITE_PATH": ":memory:"})
+    (":memory:" crea una BD desechable en un archivo temporal con WAL).
+    Con {"TESTING": True} el motor de alertas y el historial de auditoría quedan
+    apagados salvo que se activen explícitamente. cerrar_app(app) detiene sus hilos.
+    """
+    app = Flask(__name__)
+    app.secret_key = "llave_ultra_secreta"
+    app.config["DB_BACKEND"] = DB_BACKEND
+    app.config["SQLITE_PATH"] = SQLITE_PATH
+    app.config["COALESCER_LECTURAS"] = True
+    app.config["ALERTAS_ACTIVAS"] = ALERTAS_ACTIVAS
+    app.config["ALERTAS_DIAS_AVISO"] = ALERTAS_DIAS_AVISO
+    app.config["ALERTAS_ARCHIVO"] = ALERTAS_ARCHIVO
+    app.config["ALERTAS_WEBHOOK_URL"] = ALERTAS_WEBHOOK_URL
+    app.config["AUDITORIA_ACTIVA"] = AUDITORIA_ACTIVA
+    app.config["AUDITORIA_COLA_MAX"] = AUDITORIA_COLA_MAX
+    app.config["AUDITORIA_LOTE"] = AUDITORIA_LOTE
+    app.config["AUDITORIA_INTERVALO"] = AUDITORIA_INTERVALO
+    if config and config.get("TESTING"):
+        app.config["ALERTAS_ACTIVAS"] = False
+        app.config["AUDITORIA_ACTIVA"] = False
+    if config:
+        app.config.update(config)
+
+    if app.config["DB_BACKEND"] == "sqlite":
+        almacen = crear_almacenamiento("sqlite", ruta=app.config["SQLITE_PATH"])
+    else:
+        almacen = crear_almacenamiento(app.config["DB_BACKEND"])
+    almacen.inicializar()
+    app.extensions["almacenamiento"] = almacen
+
+    if app.config["COALESCER_LECTURAS"]:
+        app.extensions["singleflight"] = SingleFlight()
+
+    if app.config["ALERTAS_ACTIVAS"]:
+        motor = crear_motor_alertas(almacen, app.config)
+        motor.iniciar()
+        app.extensions["alertas"] = motor
+
+    if app.config["AUDITORIA_ACTIVA"]:
+        registro = crear_registro_auditoria(almacen, app.config)
+        registro.iniciar()
+        app.extensions["auditoria"] = registro
+
+    app.register_blueprint(bp)
+    return app
+
+def cerrar_app(app):
+    """Detiene los hilos de fondo de la app (también se llama al salir del proceso)."""
+    motor = app.extensions.get("alertas")
+    if motor is not None:
+        motor.detener()
+    registro = app.extensions.get("auditoria")
+    if registro is not None:
+        registro.detener()   # escribe lo que quede en la cola
+
+# ------------------------- Instancia por defecto -------------------------
+def __getattr__(nombre):
+    # `from app import app` / `gunicorn app:app`: la app con la configuración del
+    # entorno se crea al primer acceso, no al importar el módulo (los tests usan create_app)
+    if nombre == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 # ------------------------- Main -------------------------
 
 if __name__ == "__main__":
-    ensure_admin_user()
+    app = create_app()
+    ensure_admin_user(app.extensions["almacenamiento"])
 
     # (Opcional) imprime rutas en consola para verificar que PUT/DELETE están registrados
     print("\n=== URL MAP ===")
@@ -772,4 +682,4 @@ if __name__ == "__main__":
                port=5000,
         debug=True,
         use_reloader=False
-    )
\ No newline at end of file
+    )
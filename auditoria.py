@@ -0,0 +1,175 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+
+AUDITORIA_ACTIVA     = os.getenv("AUDITORIA_ACTIVA", "1") == "1"
+AUDITORIA_COLA_MAX   = int(os.getenv("AUDITORIA_COLA_MAX", "10000"))
+AUDITORIA_LOTE       = int(os.getenv("AUDITORIA_LOTE", "200"))
+AUDITORIA_INTERVALO  = float(os.getenv("AUDITORIA_INTERVALO", "1.0"))
+
+def _valor(v):
+    # Normaliza para comparar y serializar igual en MySQL (datetime) y SQLite (str)
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+def diferencias(antes, despues):
+    """{campo: {"antes": x, "despues": y}} solo con los campos que cambiaron."""
+    cambios = {}
+    for campo, nuevo in despues.items():
+        previo = _valor((antes or {}).get(campo))
+        nuevo = _valor(nuevo)
+        if previo is None and nuevo is None:
+            continue
+        if previo is None or nuevo is None or str(previo) != str(nuevo):
+            cambios[campo] = {"antes": previo, "despues": nuevo}
+    return cambios
+
+
+class RegistroAuditoria:
+    """Historial de cambios con escritura diferida (write-behind).
+
+    Los handlers solo calculan el diff y lo encolan (sin tocar la BD); un hilo
+    vacía la cola en lotes de hasta `lote` filas con un INSERT multi-fila a
+    audit_log. La cola es acotada: si se llena, el handler espera como mucho
+    `espera_max` segundos (contrapresión) y, si sigue llena, el registro se
+    descarta y se cuenta en las métricas. Al detener (o al salir del proceso)
+    se escribe lo que quede en la cola. Un lote que falla al escribirse se
+    reintenta `reintentos` veces con espera creciente antes de descartarse.
+    """
+
+    def __init__(self, almacen, capacidad=AUDITORIA_COLA_MAX, lote=AUDITORIA_LOTE,
+                 intervalo=AUDITORIA_INTERVALO, espera_max=0.05, reintentos=3, espera_reintento=0.2):
+        self.almacen = almacen
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._m = {
+            "encolados": 0, "escritos": 0, "descartados": 0, "esperas": 0,
+            "lotes": 0, "errores": 0, "reintentos": 0, "max_en_cola": 0, "ultimo_lote_ms": None,
+        }
+
+    # --- Productores (handlers) ---
+    def registrar(self, entidad, entidad_id, antes, despues, usuario_id=None, accion="editar"):
+        """Encola el diff; devuelve False si no hubo cambios o si se descartó."""
+        cambios = diferencias(antes, despues)
+        if not cambios:
+            return False
+        fila = {
+            "entidad": entidad,
+            "entidad_id": entidad_id,
+            "accion": accion,
+            "usuario_id": usuario_id,
+            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "cambios": cambios,
+        }
+        try:
+            self._cola.put_nowait(fila)
+        except queue.Full:
+            self._contar("esperas")
+            try:
+                self._cola.put(fila, timeout=self.espera_max)
+            except queue.Full:
+                self._contar("descartados")
+                return False
+        with self._lock:
+            self._m["encolados"] += 1
+            self._m["max_en_cola"] = max(self._m["max_en_cola"], self._cola.qsize())
+        return True
+
+    def _contar(self, clave, n=1):
+        with self._lock:
+            self._m[clave] += n
+
+    # --- Consumidor ---
+    def _tomar_lote(self, espera):
+        try:
+            filas = [self._cola.get(timeout=espera) if espera else self._cola.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(filas) < self.lote:
+            try:
+                filas.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return filas
+
+    def _escribir(self, filas):
+        inicio = time.perf_counter()
+        espera = self.espera_reintento
+        for intento in range(self.reintentos + 1):
+            try:
+                self.almacen.auditoria.registrar_lote(filas)
+                break
+            except Exception as e:
+                self._contar("errores")
+                if intento == self.reintentos:
+                    self._contar("descartados", len(filas))
+                    print(f"No se pudo escribir el historial de auditoría ({len(filas)} registros):", e)
+                    return
+                self._contar("reintentos")
+                time.sleep(espera)   # p. ej. BD bloqueada: el lote sigue en memoria
+                espera *= 2
+        with self._lock:
+            self._m["escritos"] += len(filas)
+            self._m["lotes"] += 1
+            self._m["ultimo_lote_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def vaciar(self):
+        """Escribe de inmediato todo lo encolado (usado al detener y en pruebas)."""
+        while True:
+            filas = self._tomar_lote(0)
+            if not filas:
+                return
+            self._escribir(filas)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            filas = self._tomar_lote(self.intervalo)
+            if filas:
+                self._escribir(filas)
+
+    # --- Hilo ---
+    def iniciar(self):
+        if self._hilo:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def detener(self):
+        atexit.unregister(self.detener)
+        if self._hilo:
+            self._detener.set()
+            self._hilo.join(timeout=5)
+            self._hilo = None
+        self.vaciar()
+
+    def metricas(self):
+        with self._lock:
+            m = dict(self._m)
+        m["en_cola"] = self._cola.qsize()
+        m["capacidad"] = self._cola.maxsize
+        m["activo"] = self._hilo is not None
+        return m
+
+
+def crear_registro_auditoria(almacen, config):
+    return RegistroAuditoria(
+        almacen,
+        capacidad=config.get("AUDITORIA_COLA_MAX", AUDITORIA_COLA_MAX),
+        lote=config.get("AUDITORIA_LOTE", AUDITORIA_LOTE),
+        intervalo=config.get("AUDITORIA_INTERVALO", AUDITORIA_INTERVALO),
+    )
@@ -0,0 +1,78 @@
+import threading
+from collections import Counter
+
+class _Vuelo:
+    __slots__ = ("evento", "resultado", "error", "esperando")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """Coalescencia de lecturas idénticas concurrentes.
+
+    La primera petición con una clave ejecuta la consulta (líder); las que
+    llegan con la misma clave mientras sigue en curso esperan y reciben el
+    mismo resultado ya serializado, en lugar de abrir otra conexión.
+
+    `generacion` cuenta las escrituras confirmadas (registrar_escritura); al ir
+    en la clave, una lectura posterior a una escritura no se une a un vuelo que
+    empezó antes de ella.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos = {}
+        self.generacion = 0
+        self._ejecutadas = Counter()
+        self._coalescidas = Counter()
+
+    def ejecutar(self, clave, fn, grupo=None):
+        grupo = grupo or clave
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+                self._ejecutadas[grupo] += 1
+            else:
+                vuelo.esperando += 1
+                self._coalescidas[grupo] += 1
+
+        if not lider:
+            vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = fn()
+            return vuelo.resultado
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.evento.set()
+
+    def registrar_escritura(self):
+        with self._lock:
+            self.generacion += 1
+
+    def metricas(self):
+        with self._lock:
+            grupos = set(self._ejecutadas) | set(self._coalescidas)
+            return {
+                "ejecutadas": sum(self._ejecutadas.values()),
+                "coalescidas": sum(self._coalescidas.values()),
+                "en_vuelo": len(self._vuelos),
+                "generacion": self.generacion,
+                "por_endpoint": {
+                    g: {"ejecutadas": self._ejecutadas[g], "coalescidas": self._coalescidas[g]}
+                    for g in sorted(grupos)
+                },
+            }
@@ -1,15 +1,31 @@
 import os
+import sqlite3
 from dotenv import load_dotenv
 import mysql.connector
 
 load_dotenv()
 
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")      # mysql / sqlite
+
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_PORT = int(os.getenv("DB_PORT", "3306"))
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASS = os.getenv("DB_PASS", "pass")
 DB_NAME = os.getenv("DB_NAME", "sis_control")
 
+SQLITE_PATH = os.getenv("SQLITE_PATH", "sis_control.db")
+
 def getConexion():
     return mysql.connector.connect(
         host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASS, database=DB_NAME )
+
+def _fila_dict(cursor, row):
+    return {col[0]: row[i] for i, col in enumerate(cursor.description)}
+
+def getConexionSQLite(ruta=SQLITE_PATH):
+    conn = sqlite3.connect(ruta, timeout=5, check_same_thread=False)
+    conn.row_factory = _fila_dict
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
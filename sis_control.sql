@@ -77,6 +77,42 @@ CREATE TABLE IF NOT EXISTS incidencias (
   KEY idx_inc_fecha (fecha_reporte)
 );
 
+-- 7) Alertas de programaciones (próximas / vencidas), una por programación, tipo y fecha
+CREATE TABLE IF NOT EXISTS alertas (
+  id              INT AUTO_INCREMENT PRIMARY KEY,
+  programacion_id INT NOT NULL,
+  equipo_id       INT NOT NULL,
+  tipo            ENUM('proxima','vencida') NOT NULL,
+  fecha_proxima   DATE NOT NULL,
+  fecha_alerta    DATETIME NOT NULL,
+  mensaje         VARCHAR(255) NULL,
+  CONSTRAINT uk_alertas_prog_tipo_fecha UNIQUE (programacion_id, tipo, fecha_proxima),
+  KEY idx_alertas_fecha (fecha_alerta)
+);
+
+-- 8) Auditorías de inventario (escaneo de etiquetas en recorridos de auditoría)
+CREATE TABLE IF NOT EXISTS auditorias_inventario (
+  id         INT AUTO_INCREMENT PRIMARY KEY,
+  equipo_id  INT NOT NULL,
+  usuario_id INT NULL,
+  fecha      DATETIME NOT NULL,
+  CONSTRAINT fk_aud_inv_equipo FOREIGN KEY (equipo_id) REFERENCES equipos(id),
+  CONSTRAINT fk_aud_inv_usuario FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+  KEY idx_aud_inv_equipo_fecha (equipo_id, fecha)
+);
+
+-- 9) Historial de cambios (solo inserción; sin FKs para conservar el rastro tras borrados)
+CREATE TABLE IF NOT EXISTS audit_log (
+  id         BIGINT AUTO_INCREMENT PRIMARY KEY,
+  entidad    VARCHAR(20) NOT NULL,
+  entidad_id INT NOT NULL,
+  accion     VARCHAR(20) NOT NULL,
+  usuario_id INT NULL,
+  fecha      DATETIME NOT NULL,
+  cambios    TEXT NOT NULL,
+  KEY idx_audit_entidad_fecha (entidad, entidad_id, fecha)
+);
+
 -- ==========================
 -- VISTAS
 -- ==========================
@@ -0,0 +1,156 @@
+-- Esquema equivalente a sis_control.sql para el backend SQLite (DB_BACKEND=sqlite).
+-- Se aplica automáticamente al crear la app; todas las sentencias son idempotentes.
+
+-- 1) Laboratorios
+CREATE TABLE IF NOT EXISTS laboratorios (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre      VARCHAR(100) NOT NULL,
+  ubicacion   VARCHAR(150),
+  CONSTRAINT uk_laboratorio_nombre UNIQUE (nombre)
+);
+
+-- 2) Equipos
+CREATE TABLE IF NOT EXISTS equipos (
+  id                INTEGER PRIMARY KEY AUTOINCREMENT,
+  etiqueta_activo   VARCHAR(64) NOT NULL,
+  laboratorio_id    INTEGER NOT NULL,
+  tipo              VARCHAR(64),
+  marca             VARCHAR(64),
+  modelo            VARCHAR(64),
+  estado            VARCHAR(20) NOT NULL DEFAULT 'operativo'
+                    CHECK (estado IN ('operativo','programado','en_mantenimiento','de_baja')),
+  CONSTRAINT fk_equipos_lab FOREIGN KEY (laboratorio_id) REFERENCES laboratorios(id),
+  CONSTRAINT uk_equipos_etiqueta UNIQUE (etiqueta_activo)
+);
+CREATE INDEX IF NOT EXISTS idx_equipos_lab_estado ON equipos (laboratorio_id, estado);
+CREATE INDEX IF NOT EXISTS idx_equipos_tipo_marca ON equipos (tipo, marca);
+-- Búsquedas por etiqueta sin distinguir mayúsculas (como la collation *_ci de MySQL)
+CREATE INDEX IF NOT EXISTS idx_equipos_etiqueta_nocase ON equipos (etiqueta_activo COLLATE NOCASE);
+
+-- 3) Usuarios
+CREATE TABLE IF NOT EXISTS usuarios (
+  id         INTEGER PRIMARY KEY AUTOINCREMENT,
+  usuario    VARCHAR(50) NOT NULL,
+  contrasena VARCHAR(200) NOT NULL,
+  rol        VARCHAR(20) NOT NULL DEFAULT 'solo_vista'
+             CHECK (rol IN ('solo_vista','admin')),
+  CONSTRAINT uk_usuarios_usuario UNIQUE (usuario)
+);
+
+-- 4) Programaciones de mantenimiento (fechas como TEXT 'YYYY-MM-DD')
+CREATE TABLE IF NOT EXISTS programaciones_mantenimiento (
+  id                INTEGER PRIMARY KEY AUTOINCREMENT,
+  equipo_id         INTEGER NOT NULL,
+  periodicidad_dias INTEGER NOT NULL,
+  fecha_proxima     DATE NOT NULL,
+  fecha_ultima      DATE NULL,
+  CONSTRAINT fk_prog_equipo FOREIGN KEY (equipo_id) REFERENCES equipos(id)
+);
+CREATE INDEX IF NOT EXISTS idx_prog_equipo_proxima ON programaciones_mantenimiento (equipo_id, fecha_proxima);
+
+-- 5) Mantenimientos (fechas como TEXT 'YYYY-MM-DD HH:MM:SS')
+CREATE TABLE IF NOT EXISTS mantenimientos (
+  id             INTEGER PRIMARY KEY AUTOINCREMENT,
+  equipo_id      INTEGER NOT NULL,
+  tipo           VARCHAR(20) NOT NULL CHECK (tipo IN ('preventivo','correctivo')),
+  fecha_apertura DATETIME NOT NULL,
+  fecha_cierre   DATETIME NULL,
+  estado         VARCHAR(20) NOT NULL DEFAULT 'abierto'
+                 CHECK (estado IN ('abierto','en_proceso','cerrado')),
+  descripcion    TEXT NULL,
+  CONSTRAINT fk_mant_equipo FOREIGN KEY (equipo_id) REFERENCES equipos(id)
+);
+CREATE INDEX IF NOT EXISTS idx_mant_equipo_estado ON mantenimientos (equipo_id, estado);
+CREATE INDEX IF NOT EXISTS idx_mant_fechas ON mantenimientos (fecha_apertura, fecha_cierre);
+
+-- 6) Incidencias
+CREATE TABLE IF NOT EXISTS incidencias (
+  id               INTEGER PRIMARY KEY AUTOINCREMENT,
+  equipo_id        INTEGER NOT NULL,
+  reportada_por    INTEGER NULL,
+  fecha_reporte    DATETIME NOT NULL,
+  severidad        VARCHAR(10) NOT NULL CHECK (severidad IN ('baja','media','alta')),
+  descripcion      TEXT NULL,
+  mantenimiento_id INTEGER NULL,
+  CONSTRAINT fk_inc_equipo FOREIGN KEY (equipo_id) REFERENCES equipos(id),
+  CONSTRAINT fk_inc_rep_por FOREIGN KEY (reportada_por) REFERENCES usuarios(id),
+  CONSTRAINT fk_inc_mant FOREIGN KEY (mantenimiento_id) REFERENCES mantenimientos(id)
+);
+CREATE INDEX IF NOT EXISTS idx_inc_equipo_severidad ON incidencias (equipo_id, severidad);
+CREATE INDEX IF NOT EXISTS idx_inc_fecha ON incidencias (fecha_reporte);
+
+-- 7) Alertas de programaciones (próximas / vencidas), una por programación, tipo y fecha
+CREATE TABLE IF NOT EXISTS alertas (
+  id              INTEGER PRIMARY KEY AUTOINCREMENT,
+  programacion_id INTEGER NOT NULL,
+  equipo_id       INTEGER NOT NULL,
+  tipo            VARCHAR(10) NOT NULL CHECK (tipo IN ('proxima','vencida')),
+  fecha_proxima   DATE NOT NULL,
+  fecha_alerta    DATETIME NOT NULL,
+  mensaje         VARCHAR(255) NULL,
+  CONSTRAINT uk_alertas_prog_tipo_fecha UNIQUE (programacion_id, tipo, fecha_proxima)
+);
+CREATE INDEX IF NOT EXISTS idx_alertas_fecha ON alertas (fecha_alerta);
+
+-- 8) Auditorías de inventario (escaneo de etiquetas en recorridos de auditoría)
+CREATE TABLE IF NOT EXISTS auditorias_inventario (
+  id         INTEGER PRIMARY KEY AUTOINCREMENT,
+  equipo_id  INTEGER NOT NULL,
+  usuario_id INTEGER NULL,
+  fecha      DATETIME NOT NULL,
+  CONSTRAINT fk_aud_inv_equipo FOREIGN KEY (equipo_id) REFERENCES equipos(id),
+  CONSTRAINT fk_aud_inv_usuario FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+);
+CREATE INDEX IF NOT EXISTS idx_aud_inv_equipo_fecha ON auditorias_inventario (equipo_id, fecha);
+
+-- 9) Historial de cambios (solo inserción; sin FKs para conservar el rastro tras borrados)
+CREATE TABLE IF NOT EXISTS audit_log (
+  id         INTEGER PRIMARY KEY AUTOINCREMENT,
+  entidad    VARCHAR(20) NOT NULL,
+  entidad_id INTEGER NOT NULL,
+  accion     VARCHAR(20) NOT NULL,
+  usuario_id INTEGER NULL,
+  fecha      DATETIME NOT NULL,
+  cambios    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_entidad_fecha ON audit_log (entidad, entidad_id, fecha);
+
+-- ==========================
+-- VISTAS (equivalentes a las de MySQL)
+-- ==========================
+
+DROP VIEW IF EXISTS vista_programaciones_proximas;
+CREATE VIEW vista_programaciones_proximas AS
+SELECT
+  p.id,
+  p.equipo_id,
+  e.etiqueta_activo,
+  e.laboratorio_id,
+  l.nombre AS laboratorio,
+  p.periodicidad_dias,
+  p.fecha_proxima,
+  MAX(CAST(julianday(p.fecha_proxima) - julianday(date('now', 'localtime')) AS INTEGER), 0) AS dias_restantes
+FROM programaciones_mantenimiento p
+JOIN equipos      e ON e.id = p.equipo_id
+JOIN laboratorios l ON l.id = e.laboratorio_id
+WHERE p.fecha_proxima >= date('now', 'localtime');
+
+DROP VIEW IF EXISTS vista_mantenimientos_detalle;
+CREATE VIEW vista_mantenimientos_detalle AS
+SELECT
+  m.id,
+  m.tipo,
+  m.estado,
+  m.fecha_apertura,
+  m.fecha_cierre,
+  m.descripcion,
+  e.id   AS equipo_id,
+  e.etiqueta_activo,
+  e.tipo  AS equipo_tipo,
+  e.marca AS equipo_marca,
+  e.modelo AS equipo_modelo,
+  l.nombre    AS laboratorio,
+  l.ubicacion AS laboratorio_ubicacion
+FROM mantenimientos m
+JOIN equipos      e ON e.id = m.equipo_id
+JOIN laboratorios l ON l.id = e.laboratorio_id;
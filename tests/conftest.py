@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import cerrar_app, create_app, ensure_admin_user
+
+
+@pytest.fixture
+def app():
+    app = create_app({
+        "DB_BACKEND": "sqlite",
+        "SQLITE_PATH": ":memory:",
+        "TESTING": True,
+    })
+    almacen = app.extensions["almacenamiento"]
+    ensure_admin_user(almacen)
+    almacen.ejecutar("INSERT INTO laboratorios (nombre, ubicacion) VALUES (%s,%s)", ("Lab Redes", "Edificio A"))
+    yield app
+    cerrar_app(app)
+
+
+@pytest.fixture
+def almacen(app):
+    return app.extensions["almacenamiento"]
+
+
+@pytest.fixture
+def admin(app):
+    c = app.test_client()
+    r = c.post("/login", json={"usuario": "admin", "contrasena": "admin"})
+    assert r.status_code == 200
+    return c
@@ -0,0 +1,172 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from alertas import MotorAlertas
+
+
+class Reloj:
+    def __init__(self, ahora):
+        self.ahora = ahora
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, **delta):
+        self.ahora += timedelta(**delta)
+
+
+class Sumidero:
+    def __init__(self):
+        self.alertas = []
+
+    def enviar(self, alerta):
+        self.alertas.append(alerta)
+
+
+@pytest.fixture
+def programacion(almacen):
+    almacen.equipos.crear({"etiqueta_activo": "PC-1", "laboratorio_id": 1})
+    return almacen.programaciones.crear(
+        {"equipo_id": 1, "periodicidad_dias": 30, "fecha_proxima": "2025-03-10"})
+
+
+def test_dispara_proxima_y_vencida_en_su_momento(almacen, programacion):
+    reloj = Reloj(datetime(2025, 3, 2, 12, 0))
+    sumidero = Sumidero()
+    motor = MotorAlertas(almacen, [sumidero], dias_aviso=7, reloj=reloj)
+    motor.cargar()
+
+    assert motor.revisar() == 0
+    assert motor.estado()["proximo"] == "2025-03-03 00:00:00"
+    reloj.avanzar(hours=12)
+    assert motor.revisar() == 1
+    assert sumidero.alertas[-1]["tipo"] == "proxima"
+    assert sumidero.alertas[-1]["dias_restantes"] == 7
+
+    reloj.ahora = datetime(2025, 3, 10, 23, 59)
+    assert motor.revisar() == 0
+    reloj.avanzar(minutes=1)
+    assert motor.revisar() == 1
+    assert sumidero.alertas[-1]["tipo"] == "vencida"
+    assert [a["tipo"] for a in almacen.alertas.listar(programacion_id=programacion)] == ["vencida", "proxima"]
+
+
+def test_programacion_ya_vencida_solo_dispara_vencida(almacen, programacion):
+    sumidero = Sumidero()
+    motor = MotorAlertas(almacen, [sumidero], dias_aviso=7, reloj=Reloj(datetime(2025, 4, 1)))
+    motor.cargar()
+    assert motor.revisar() == 1
+    assert [a["tipo"] for a in sumidero.alertas] == ["vencida"]
+
+
+def test_no_repite_alertas_tras_reiniciar(almacen, programacion):
+    reloj = Reloj(datetime(2025, 3, 12))
+    primero = MotorAlertas(almacen, [], reloj=reloj)
+    primero.cargar()
+    assert primero.revisar() == 1
+
+    sumidero = Sumidero()
+    segundo = MotorAlertas(almacen, [sumidero], reloj=reloj)
+    segundo.cargar()
+    assert segundo.revisar() == 0
+    assert sumidero.alertas == []
+
+
+def test_reprogramar_y_quitar(almacen, programacion):
+    reloj = Reloj(datetime(2025, 3, 12))
+    sumidero = Sumidero()
+    motor = MotorAlertas(almacen, [sumidero], dias_aviso=7, reloj=reloj)
+    motor.cargar()
+
+    # Se movió la fecha en la BD y en el motor antes de revisar: nada vencido
+    almacen.programaciones.actualizar(programacion, {"fecha_proxima": "2025-04-30"})
+    motor.programar(programacion, "2025-04-30")
+    assert motor.revisar() == 0
+    assert motor.estado()["proximo"] == "2025-04-23 00:00:00"
+
+    motor.quitar(programacion)
+    reloj.ahora = datetime(2025, 5, 2)
+    assert motor.revisar() == 0
+    assert sumidero.alertas == []
+
+
+def test_hilo_dispara_lo_pendiente_al_iniciar(almacen, programacion):
+    sumidero = Sumidero()
+    motor = MotorAlertas(almacen, [sumidero], reloj=Reloj(datetime(2025, 3, 12)))
+    motor.iniciar()
+    try:
+        limite = time.monotonic() + 5
+        while not sumidero.alertas and time.monotonic() < limite:
+            time.sleep(0.01)
+    finally:
+        motor.detener()
+    assert [a["tipo"] for a in sumidero.alertas] == ["vencida"]
+
+
+def test_reintenta_la_carga_inicial_si_la_bd_no_responde(almacen, programacion, monkeypatch):
+    listar = almacen.programaciones.listar_vencimientos
+    intentos = []
+    def arranque_lento():
+        intentos.append(1)
+        if len(intentos) < 3:
+            raise RuntimeError("Can't connect to MySQL server")
+        return listar()
+    monkeypatch.setattr(almacen.programaciones, "listar_vencimientos", arranque_lento)
+
+    sumidero = Sumidero()
+    motor = MotorAlertas(almacen, [sumidero], reloj=Reloj(datetime(2025, 3, 12)))
+    motor.REINTENTO_CARGA = 0.01
+    motor.iniciar()
+    try:
+        limite = time.monotonic() + 5
+        while not sumidero.alertas and time.monotonic() < limite:
+            time.sleep(0.01)
+    finally:
+        motor.detener()
+    assert len(intentos) == 3
+    assert motor.estado()["cargado"] is True
+    assert [a["tipo"] for a in sumidero.alertas] == ["vencida"]
+
+
+def test_reintenta_alerta_que_fallo_al_dispararse(almacen, programacion, monkeypatch):
+    reloj = Reloj(datetime(2025, 3, 11, 8, 0))
+    sumidero = Sumidero()
+    motor = MotorAlertas(almacen, [sumidero], dias_aviso=7, reloj=reloj)
+    motor.cargar()
+
+    registrar = almacen.alertas.registrar
+    def caida(a):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(almacen.alertas, "registrar", caida)
+    assert motor.revisar() == 0
+    assert motor.estado()["reintentos"] == 1
+
+    monkeypatch.setattr(almacen.alertas, "registrar", registrar)
+    assert motor.revisar() == 0          # aún no llega el momento del reintento
+    reloj.avanzar(seconds=MotorAlertas.REINTENTO)
+    assert motor.revisar() == 1
+    assert [a["tipo"] for a in sumidero.alertas] == ["vencida"]
+    assert sumidero.alertas[0]["fecha_proxima"] == date(2025, 3, 10).isoformat()
+
+
+def test_testing_apaga_el_motor_salvo_que_se_pida(app):
+    from app import cerrar_app, create_app
+    assert "alertas" not in app.extensions
+
+    otra = create_app({"DB_BACKEND": "sqlite", "SQLITE_PATH": ":memory:", "TESTING": True,
+                       "ALERTAS_ACTIVAS": True})
+    motor = otra.extensions["alertas"]
+    assert motor._hilo.is_alive()
+    cerrar_app(otra)
+    assert motor._hilo is None
+
+
+def test_sumidero_archivo_usa_ruta_absoluta(tmp_path, monkeypatch):
+    from alertas import SumideroArchivo
+    monkeypatch.chdir(tmp_path)
+    s = SumideroArchivo("alertas.jsonl")
+    monkeypatch.chdir("/")
+    s.enviar({"tipo": "vencida"})
+    assert (tmp_path / "alertas.jsonl").read_text(encoding="utf-8").strip() == '{"tipo": "vencida"}'
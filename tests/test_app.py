@@ -0,0 +1,16 @@
+import app as modulo_app
+
+
+def test_instancia_por_defecto_para_wsgi(monkeypatch):
+    creadas = []
+    monkeypatch.setattr(modulo_app, "create_app", lambda: creadas.append(1) or "wsgi-app")
+    # Sin instancia previa; al terminar el módulo queda como estaba
+    monkeypatch.setitem(vars(modulo_app), "app", None)
+    monkeypatch.delitem(vars(modulo_app), "app")
+
+    assert modulo_app.app == "wsgi-app"
+    assert modulo_app.app == "wsgi-app"
+    assert creadas == [1]
+
+    monkeypatch.undo()
+    assert "app" not in vars(modulo_app)
@@ -0,0 +1,86 @@
+import pytest
+
+from auditoria import RegistroAuditoria, diferencias
+
+
+@pytest.fixture
+def equipo(almacen):
+    almacen.equipos.crear({"etiqueta_activo": "PC-1", "laboratorio_id": 1})
+    return almacen.equipos.obtener(1)
+
+
+def test_diferencias_ignora_campos_sin_cambio():
+    antes = {"estado": "operativo", "laboratorio_id": 1, "marca": None}
+    assert diferencias(antes, {"estado": "de_baja", "laboratorio_id": "1", "marca": None}) == {
+        "estado": {"antes": "operativo", "despues": "de_baja"}}
+
+
+def test_reintenta_lote_ante_error_transitorio(almacen, equipo, monkeypatch):
+    registro = RegistroAuditoria(almacen, espera_reintento=0)
+    escribir = almacen.auditoria.registrar_lote
+    fallos = []
+    def inestable(filas):
+        if len(fallos) < 2:
+            fallos.append(1)
+            raise RuntimeError("database is locked")
+        return escribir(filas)
+    monkeypatch.setattr(almacen.auditoria, "registrar_lote", inestable)
+
+    registro.registrar("equipo", 1, equipo, {"estado": "de_baja"})
+    registro.vaciar()
+    m = registro.metricas()
+    assert (m["escritos"], m["reintentos"], m["descartados"]) == (1, 2, 0)
+    assert len(almacen.auditoria.historial("equipo", 1)) == 1
+
+
+def test_descarta_tras_agotar_reintentos(almacen, equipo, monkeypatch):
+    registro = RegistroAuditoria(almacen, reintentos=2, espera_reintento=0)
+    def caida(filas):
+        raise RuntimeError("no such table: audit_log")
+    monkeypatch.setattr(almacen.auditoria, "registrar_lote", caida)
+
+    registro.registrar("equipo", 1, equipo, {"estado": "de_baja"})
+    registro.vaciar()
+    m = registro.metricas()
+    assert (m["escritos"], m["errores"], m["descartados"]) == (0, 3, 1)
+
+
+def test_detener_escribe_lo_pendiente(almacen, equipo):
+    registro = RegistroAuditoria(almacen, lote=4, intervalo=60)
+    registro.iniciar()
+    for i in range(10):
+        assert registro.registrar("equipo", 1, equipo, {"modelo": f"M{i}"})
+    registro.detener()
+
+    m = registro.metricas()
+    assert (m["encolados"], m["escritos"], m["en_cola"], m["activo"]) == (10, 10, 0, False)
+    assert len(almacen.auditoria.historial("equipo", 1)) == 10
+
+
+def test_cola_llena_aplica_contrapresion_y_descarta(almacen, equipo):
+    registro = RegistroAuditoria(almacen, capacidad=3, espera_max=0.01)   # sin hilo: nadie vacía
+    aceptados = [registro.registrar("equipo", 1, equipo, {"modelo": f"M{i}"}) for i in range(5)]
+    assert aceptados == [True, True, True, False, False]
+    m = registro.metricas()
+    assert (m["en_cola"], m["max_en_cola"], m["esperas"], m["descartados"]) == (3, 3, 2, 2)
+
+
+def test_historial_desde_los_handlers(tmp_path):
+    from app import cerrar_app, create_app, ensure_admin_user
+    app = create_app({"DB_BACKEND": "sqlite", "SQLITE_PATH": str(tmp_path / "h.db"), "TESTING": True,
+                      "AUDITORIA_ACTIVA": True, "AUDITORIA_INTERVALO": 60})
+    almacen = app.extensions["almacenamiento"]
+    ensure_admin_user(almacen)
+    almacen.ejecutar("INSERT INTO laboratorios (nombre) VALUES (%s)", ("Lab",))
+    c = app.test_client()
+    c.post("/login", json={"usuario": "admin", "contrasena": "admin"})
+    c.post("/equipos", json={"etiqueta_activo": "PC-1", "laboratorio_id": 1})
+    c.put("/equipos/1", json={"estado": "en_mantenimiento", "laboratorio_id": 1})
+    c.post("/equipos/auditar", json={"etiquetas": ["pc-1"], "estado": "operativo"})
+    cerrar_app(app)
+
+    hist = c.get("/equipos/1/historial").json
+    assert [(h["accion"], h["usuario"], h["cambios"]) for h in hist] == [
+        ("auditar", "admin", {"estado": {"antes": "en_mantenimiento", "despues": "operativo"}}),
+        ("editar", "admin", {"estado": {"antes": "operativo", "despues": "en_mantenimiento"}}),
+    ]
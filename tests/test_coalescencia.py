@@ -0,0 +1,143 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from coalescencia import SingleFlight
+
+
+def _esperar(condicion, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite, "timeout"
+        time.sleep(0.005)
+
+
+def test_llamadas_concurrentes_comparten_una_ejecucion():
+    sf = SingleFlight()
+    liberar = threading.Event()
+    llamadas = []
+
+    def consulta():
+        llamadas.append(1)
+        liberar.wait(5)
+        return ["resultado"]
+
+    with ThreadPoolExecutor(max_workers=10) as ex:
+        futuros = [ex.submit(sf.ejecutar, "k", consulta, "grupo") for _ in range(10)]
+        _esperar(lambda: sf.metricas()["coalescidas"] == 9)
+        liberar.set()
+        resultados = [f.result() for f in futuros]
+
+    assert llamadas == [1]
+    assert all(r is resultados[0] for r in resultados)
+    m = sf.metricas()
+    assert (m["ejecutadas"], m["coalescidas"], m["en_vuelo"]) == (1, 9, 0)
+    assert m["por_endpoint"] == {"grupo": {"ejecutadas": 1, "coalescidas": 9}}
+
+
+def test_error_del_lider_llega_a_los_que_esperan():
+    sf = SingleFlight()
+    liberar = threading.Event()
+
+    def consulta():
+        liberar.wait(5)
+        raise RuntimeError("BD caída")
+
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futuros = [ex.submit(sf.ejecutar, "k", consulta) for _ in range(3)]
+        _esperar(lambda: sf.metricas()["coalescidas"] == 2)
+        liberar.set()
+        for f in futuros:
+            with pytest.raises(RuntimeError):
+                f.result()
+    # La clave se libera: la siguiente llamada vuelve a ejecutar
+    assert sf.ejecutar("k", lambda: "ok") == "ok"
+
+
+def test_get_concurrentes_identicos_hacen_una_consulta(app, almacen, monkeypatch):
+    sf = app.extensions["singleflight"]
+    liberar = threading.Event()
+    llamadas = []
+    listar = almacen.equipos.listar
+
+    def lenta(**filtros):
+        llamadas.append(filtros)
+        liberar.wait(5)
+        return listar(**filtros)
+    monkeypatch.setattr(almacen.equipos, "listar", lenta)
+    almacen.equipos.crear({"etiqueta_activo": "PC-1", "laboratorio_id": 1})
+
+    def pedir(url):
+        c = app.test_client()
+        c.post("/login", json={"usuario": "admin", "contrasena": "admin"})
+        r = c.get(url)
+        return r.status_code, r.get_data()
+
+    urls = ["/equipos?estado=operativo"] * 6 + ["/equipos?estado=operativo&tipo="] * 2 + ["/equipos?estado=de_baja"] * 2
+    with ThreadPoolExecutor(max_workers=len(urls)) as ex:
+        futuros = [ex.submit(pedir, u) for u in urls]
+        _esperar(lambda: sf.metricas()["coalescidas"] == 8)
+        liberar.set()
+        respuestas = [f.result() for f in futuros]
+
+    assert len(llamadas) == 2   # 'tipo=' vacío no cambia la clave
+    assert all(s == 200 for s, _ in respuestas)
+    assert len({cuerpo for _, cuerpo in respuestas[:8]}) == 1
+    assert b"PC-1" in respuestas[0][1] and b"PC-1" not in respuestas[-1][1]
+
+
+def test_parametros_repetidos_usan_el_primer_valor_en_la_clave(app, almacen, monkeypatch):
+    sf = app.extensions["singleflight"]
+    liberar = threading.Event()
+    listar = almacen.equipos.listar
+
+    def lenta(**filtros):
+        liberar.wait(5)
+        return listar(**filtros)
+    monkeypatch.setattr(almacen.equipos, "listar", lenta)
+    almacen.equipos.crear({"etiqueta_activo": "OP", "laboratorio_id": 1, "estado": "operativo"})
+    almacen.equipos.crear({"etiqueta_activo": "BAJA", "laboratorio_id": 1, "estado": "de_baja"})
+
+    def pedir(url):
+        c = app.test_client()
+        c.post("/login", json={"usuario": "admin", "contrasena": "admin"})
+        return [e["etiqueta_activo"] for e in c.get(url).json]
+
+    urls = ["/equipos?estado=operativo&estado=de_baja", "/equipos?estado=de_baja&estado=operativo",
+            "/equipos?estado=&estado=de_baja"]
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futuros = [ex.submit(pedir, u) for u in urls]
+        _esperar(lambda: sf.metricas()["en_vuelo"] == 3)
+        liberar.set()
+        assert [f.result() for f in futuros] == [["OP"], ["BAJA"], ["BAJA", "OP"]]
+
+
+def test_lectura_tras_escritura_no_se_une_a_un_vuelo_anterior(app, almacen, monkeypatch):
+    sf = app.extensions["singleflight"]
+    liberar = threading.Event()
+    listar = almacen.equipos.listar
+    llamadas = []
+
+    def lenta(**filtros):
+        # El primer vuelo lee antes de la escritura y queda esperando
+        datos = listar(**filtros)
+        llamadas.append(len(datos))
+        if len(llamadas) == 1:
+            liberar.wait(5)
+        return datos
+    monkeypatch.setattr(almacen.equipos, "listar", lenta)
+
+    c, otro = app.test_client(), app.test_client()
+    for cliente in (c, otro):
+        cliente.post("/login", json={"usuario": "admin", "contrasena": "admin"})
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        anterior = ex.submit(lambda: otro.get("/equipos").json)
+        _esperar(lambda: llamadas == [0])
+        assert c.post("/equipos", json={"etiqueta_activo": "NUEVO", "laboratorio_id": 1}).status_code == 201
+        despues = c.get("/equipos").json
+        liberar.set()
+        assert anterior.result() == []
+    assert [e["etiqueta_activo"] for e in despues] == ["NUEVO"]
+    assert sf.metricas()["coalescidas"] == 0
@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_memoria_soporta_escrituras_y_lecturas_concurrentes(app):
+    def trabajador(n):
+        c = app.test_client()
+        c.post("/login", json={"usuario": "admin", "contrasena": "admin"})
+        estados = []
+        for i in range(100):
+            if i % 2:
+                r = c.post("/equipos", json={"etiqueta_activo": f"T{n}-{i}", "laboratorio_id": 1})
+            else:
+                r = c.get("/equipos")
+            estados.append(r.status_code)
+        return estados
+
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        estados = [e for lote in ex.map(trabajador, range(8)) for e in lote]
+
+    assert len(estados) == 800
+    assert all(e in (200, 201) for e in estados), sorted(set(estados))
+    assert len(app.extensions["almacenamiento"].equipos.listar()) == 400
+
+
+def test_memoria_aisla_cada_app(app):
+    from app import create_app
+    otra = create_app({"DB_BACKEND": "sqlite", "SQLITE_PATH": ":memory:",
+                       "TESTING": True})
+    app.extensions["almacenamiento"].equipos.crear({"etiqueta_activo": "SOLO-A", "laboratorio_id": 1})
+    assert otra.extensions["almacenamiento"].equipos.listar() == []
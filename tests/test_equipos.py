@@ -0,0 +1,88 @@
+def _crear(almacen, *etiquetas):
+    for e in etiquetas:
+        almacen.equipos.crear({"etiqueta_activo": e, "laboratorio_id": 1})
+
+
+def test_buscar_por_prefijo_ignora_mayusculas(almacen):
+    _crear(almacen, "PC-LAB-01", "PC-LAB-02", "SRV-01")
+    etiquetas = [e["etiqueta_activo"] for e in almacen.equipos.buscar_por_prefijo("pc-lab")]
+    assert etiquetas == ["PC-LAB-01", "PC-LAB-02"]
+
+
+def test_buscar_por_prefijo_escapa_comodines(almacen):
+    _crear(almacen, "A_1", "AB1", "50%-X", "500-X")
+    assert [e["etiqueta_activo"] for e in almacen.equipos.buscar_por_prefijo("a_")] == ["A_1"]
+    assert [e["etiqueta_activo"] for e in almacen.equipos.buscar_por_prefijo("50%")] == ["50%-X"]
+
+
+def test_buscar_por_prefijo_usa_indice(almacen):
+    sql = f"EXPLAIN QUERY PLAN SELECT id FROM equipos e WHERE {almacen.empieza_con('e.etiqueta_activo')}"
+    plan = " ".join(f["detail"] for f in almacen.consultar(sql, (almacen.patron_prefijo("PC"),)))
+    assert "idx_equipos_etiqueta_nocase" in plan
+
+
+def test_buscar_limite_acotado(almacen, admin):
+    _crear(almacen, "PC-1", "PC-2", "PC-3")
+    assert len(admin.get("/equipos/buscar?prefijo=pc&limite=-1").json) == 1
+    assert len(admin.get("/equipos/buscar?prefijo=pc&limite=0").json) == 1
+    assert len(admin.get("/equipos/buscar?prefijo=pc&limite=2").json) == 2
+
+
+def test_lookup_empareja_sin_distinguir_mayusculas(almacen, admin):
+    _crear(almacen, "ABC-1", "ABC-2")
+    r = admin.post("/equipos/lookup", json={"etiquetas": ["abc-2", "nope", "ABC-1", "abc-1"]})
+    assert r.status_code == 200
+    assert [e["etiqueta_activo"] for e in r.json["encontrados"]] == ["ABC-2", "ABC-1"]
+    assert r.json["desconocidas"] == ["nope"]
+
+
+def test_auditar_cuenta_y_marca_cada_equipo_una_vez(almacen, admin):
+    _crear(almacen, "ABC-1")
+    r = admin.post("/equipos/auditar", json={"etiquetas": ["abc-1", "ABC-1", "nope"], "estado": "de_baja"})
+    assert r.status_code == 200
+    assert r.json["actualizados"] == 1 and r.json["auditados"] == 1
+    assert r.json["desconocidas"] == ["nope"]
+    assert almacen.equipos.obtener(1)["estado"] == "de_baja"
+    assert almacen.consultar_uno("SELECT COUNT(*) AS total FROM auditorias_inventario")["total"] == 1
+
+
+def test_lookup_por_lotes(almacen, admin, monkeypatch):
+    import almacenamiento
+    monkeypatch.setattr(almacenamiento._trozos, "__defaults__", (2,))
+    _crear(almacen, *[f"EQ-{i}" for i in range(5)])
+    etiquetas = ["eq-4", "EQ-0", "X", "EQ-4", "eq-2"]
+    r = admin.post("/equipos/lookup", json={"etiquetas": etiquetas})
+    assert [e["etiqueta_activo"] for e in r.json["encontrados"]] == ["EQ-4", "EQ-0", "EQ-2"]
+    assert r.json["desconocidas"] == ["X"]
+
+
+def test_lookup_lote_completo(almacen, admin):
+    import almacenamiento
+    _crear(almacen, *[f"EQ-{i}" for i in range(almacenamiento.TAM_LOTE + 10)])
+    etiquetas = [f"eq-{i}" for i in range(almacenamiento.TAM_LOTE + 10)] + ["X"]
+    r = admin.post("/equipos/lookup", json={"etiquetas": etiquetas})
+    assert len(r.json["encontrados"]) == almacenamiento.TAM_LOTE + 10
+    assert r.json["desconocidas"] == ["X"]
+
+
+def test_emparejamiento_lo_decide_la_bd(almacen, admin, monkeypatch):
+    # Simula una collation que además ignora acentos (como *_ai_ci en MySQL)
+    import unicodedata
+    def plegar(v):
+        return unicodedata.normalize("NFKD", v).encode("ascii", "ignore").decode().lower()
+    conectar = almacen.conectar
+    def conectar_con_collation():
+        conn = conectar()
+        conn.create_function("plegar", 1, plegar, deterministic=True)
+        return conn
+    monkeypatch.setattr(almacen, "conectar", conectar_con_collation)
+    monkeypatch.setattr(almacen, "sin_mayusculas", lambda col: f"plegar({col})")
+    _crear(almacen, "EQUIPO-Ñ")
+
+    r = admin.post("/equipos/lookup", json={"etiquetas": ["equipo-n", "otro"]})
+    assert [e["etiqueta_activo"] for e in r.json["encontrados"]] == ["EQUIPO-Ñ"]
+    assert r.json["desconocidas"] == ["otro"]
+
+    r = admin.post("/equipos/auditar", json={"etiquetas": ["equipo-n"], "estado": "de_baja"})
+    assert (r.json["actualizados"], r.json["desconocidas"]) == (1, [])
+    assert almacen.equipos.obtener(1)["estado"] == "de_baja"
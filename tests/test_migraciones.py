@@ -0,0 +1,65 @@
+import os
+import re
+
+import almacenamiento
+from almacenamiento import MIGRACIONES_MYSQL, MySQLAlmacenamiento, _sentencias
+
+# Tablas agregadas después de la versión inicial de sis_control.sql
+NUEVAS = ["alertas", "auditorias_inventario", "audit_log"]
+
+
+class ConexionFalsa:
+    def __init__(self):
+        self.sql = []
+        self.confirmada = False
+
+    def cursor(self, **opciones):
+        return self
+
+    def execute(self, sql, params=()):
+        self.sql.append(sql)
+
+    lastrowid = rowcount = None
+
+    def commit(self):
+        self.confirmada = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _script():
+    with open(MIGRACIONES_MYSQL, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_migraciones_son_idempotentes():
+    sentencias = _sentencias(_script())
+    assert sentencias
+    for sql in sentencias:
+        assert re.match(r"CREATE (TABLE|INDEX) IF NOT EXISTS ", sql), sql
+
+
+def test_mysql_inicializar_aplica_migraciones(monkeypatch):
+    conn = ConexionFalsa()
+    monkeypatch.setattr(almacenamiento, "getConexion", lambda: conn)
+    MySQLAlmacenamiento().inicializar()
+    assert conn.sql == _sentencias(_script())
+    assert conn.confirmada
+
+
+def _tabla(script, nombre):
+    m = re.search(rf"CREATE TABLE IF NOT EXISTS {nombre} \(.*?\n\);", script, re.S)
+    return m and m.group(0)
+
+
+def test_migraciones_coinciden_con_el_esquema():
+    with open(os.path.join(os.path.dirname(MIGRACIONES_MYSQL), "sis_control.sql"), encoding="utf-8") as f:
+        esquema = f.read()
+    migraciones = _script()
+    for tabla in NUEVAS:
+        assert _tabla(migraciones, tabla) is not None, tabla
+        assert _tabla(migraciones, tabla) == _tabla(esquema, tabla)
@@ -0,0 +1,128 @@
+"""Mismo comportamiento de los repositorios en cada backend.
+
+SQLite corre siempre (BD temporal). MySQL solo con SIS_CONTROL_TEST_MYSQL=1,
+contra una BD vacía cargada con sis_control.sql (variables DB_* de conexion.py).
+"""
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from almacenamiento import crear_almacenamiento
+
+BACKENDS = [
+    "sqlite",
+    pytest.param("mysql", marks=pytest.mark.skipif(
+        os.getenv("SIS_CONTROL_TEST_MYSQL") != "1", reason="SIS_CONTROL_TEST_MYSQL=1 para probar MySQL")),
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def db(request):
+    if request.param == "sqlite":
+        db = crear_almacenamiento("sqlite", ruta=":memory:")
+    else:
+        db = crear_almacenamiento("mysql")
+    db.inicializar()
+    return db
+
+
+@pytest.fixture
+def lab(db):
+    return db.ejecutar("INSERT INTO laboratorios (nombre, ubicacion) VALUES (%s,%s)",
+                       ("Lab Parity", "Edificio B")).lastrowid
+
+
+@pytest.fixture
+def eq(db, lab):
+    return db.equipos.crear({"etiqueta_activo": "PAR-1", "laboratorio_id": lab,
+                             "tipo": "PC", "marca": "Dell", "modelo": "7090"})
+
+
+def test_laboratorios(db, lab):
+    assert {"id": lab, "nombre": "Lab Parity", "ubicacion": "Edificio B"} in db.laboratorios.listar()
+    assert db.laboratorios.obtener(lab)["nombre"] == "Lab Parity"
+
+
+def test_usuarios(db):
+    uid = db.usuarios.crear("parity", "hash", "admin")
+    u = db.usuarios.obtener_por_usuario("parity")
+    assert (u["id"], u["rol"]) == (uid, "admin")
+    assert db.usuarios.obtener_por_usuario("nadie") is None
+
+
+def test_equipos(db, lab, eq):
+    otro = db.equipos.crear({"etiqueta_activo": "PAR-2", "laboratorio_id": lab, "estado": "de_baja"})
+    assert [e["id"] for e in db.equipos.listar(laboratorio_id=lab)] == [otro, eq]
+    assert [e["id"] for e in db.equipos.listar(laboratorio_id=lab, estado="de_baja")] == [otro]
+    assert [e["id"] for e in db.equipos.listar(laboratorio_id=lab, tipo="PC", marca="Dell")] == [eq]
+    assert db.equipos.listar(laboratorio_id=lab)[1]["laboratorio"] == "Lab Parity"
+
+    assert db.equipos.existe_etiqueta("PAR-1")
+    assert [e["etiqueta_activo"] for e in db.equipos.buscar_por_prefijo("par-")] == ["PAR-1", "PAR-2"]
+
+    assert db.equipos.actualizar(eq, {"estado": "en_mantenimiento"}) == 1
+    assert db.equipos.obtener(eq)["estado"] == "en_mantenimiento"
+    assert db.equipos.contar_referencias(otro) == 0
+    assert db.equipos.eliminar(otro) is True
+    assert db.equipos.eliminar(otro) is False
+
+
+def test_programaciones(db, eq):
+    hoy = date.today()
+    pid = db.programaciones.crear({"equipo_id": eq, "periodicidad_dias": 30,
+                                   "fecha_proxima": (hoy + timedelta(days=5)).isoformat()})
+    fila = db.programaciones.listar(equipo_id=eq)[0]
+    assert (fila["id"], fila["etiqueta_activo"], fila["fecha_ultima"]) == (pid, "PAR-1", None)
+    assert fila["fecha_proxima"] == (hoy + timedelta(days=5)).isoformat()
+
+    prox = db.programaciones.proximas(hasta_dias=10, equipo_id=eq)
+    assert [(p["id"], p["dias_restantes"]) for p in prox] == [(pid, 5)]
+    assert db.programaciones.proximas(hasta_dias=2, equipo_id=eq) == []
+
+    det = db.programaciones.obtener_detalle(pid)
+    assert (det["equipo_id"], det["laboratorio"]) == (eq, "Lab Parity")
+    assert {"id": pid, "fecha_proxima": fila["fecha_proxima"]} in db.programaciones.listar_vencimientos()
+    assert db.equipos.contar_referencias(eq) == 1
+
+
+def test_mantenimientos_e_incidencias(db, eq):
+    mid = db.mantenimientos.crear({"equipo_id": eq, "tipo": "preventivo",
+                                   "fecha_apertura": "2025-01-02 10:00:00"})
+    m = db.mantenimientos.listar(equipo_id=eq, desde="2025-01-02", hasta="2025-01-02")[0]
+    assert (m["id"], m["estado"], m["fecha_apertura"], m["fecha_cierre"]) == (
+        mid, "abierto", "2025-01-02 10:00:00", None)
+    assert db.mantenimientos.listar(equipo_id=eq, desde="2025-01-03") == []
+
+    iid = db.incidencias.crear({"equipo_id": eq, "severidad": "alta", "mantenimiento_id": mid,
+                                "fecha_reporte": "2025-01-03 11:30:00"})
+    i = db.incidencias.listar(equipo_id=eq, severidad="alta")[0]
+    assert (i["id"], i["mantenimiento_id"], i["fecha_reporte"]) == (iid, mid, "2025-01-03 11:30:00")
+    assert db.mantenimientos.contar_incidencias(mid) == 1
+
+    encontrados, _ = db.equipos.buscar_por_etiquetas(["par-1"])
+    assert [m["id"] for m in encontrados[0]["mantenimientos_abiertos"]] == [mid]
+    assert encontrados[0]["ultima_incidencia"]["id"] == iid
+
+
+def test_alertas(db, eq):
+    pid = db.programaciones.crear({"equipo_id": eq, "periodicidad_dias": 30, "fecha_proxima": "2025-03-10"})
+    alerta = {"programacion_id": pid, "equipo_id": eq, "tipo": "vencida",
+              "fecha_proxima": "2025-03-10", "fecha_alerta": "2025-03-11 00:00:00", "mensaje": "x"}
+    assert db.alertas.registrar(alerta) is True
+    assert db.alertas.registrar(alerta) is False
+    fila = db.alertas.listar(programacion_id=pid)[0]
+    assert (fila["etiqueta_activo"], fila["fecha_proxima"], fila["fecha_alerta"]) == (
+        "PAR-1", "2025-03-10", "2025-03-11 00:00:00")
+
+
+def test_auditoria(db, eq):
+    db.auditoria.registrar_lote([
+        {"entidad": "equipo", "entidad_id": eq, "accion": "editar", "usuario_id": None,
+         "fecha": f"2025-01-0{d} 09:00:00", "cambios": {"estado": {"antes": "a", "despues": str(d)}}}
+        for d in (1, 2)
+    ])
+    hist = db.auditoria.historial("equipo", eq)
+    assert [h["fecha"] for h in hist] == ["2025-01-02 09:00:00", "2025-01-01 09:00:00"]
+    assert hist[0]["cambios"] == {"estado": {"antes": "a", "despues": "2"}}
+    assert db.auditoria.historial("equipo", eq, limite=1)[0]["fecha"] == "2025-01-02 09:00:00"